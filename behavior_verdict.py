@@ -1,86 +1,131 @@
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+# Paylaşılan güvenli varsayılan: çağıran tarafın mutasyonuna kapalı
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
 
 logger = logging.getLogger("BehaviorVerdict")
 
+# Fiyat yönü (düşüş/yatay/yükseliş) x Balina akışı (satış/nötr/alış) matrisi.
+# Her hücre: (correlation_verdict, risk_delta, opsiyonel açıklama)
+# İki işaret hesabı + tek indeksleme, 6 dallı if/elif kaskadının yerini alır.
+_CORR_TABLE = (
+    (  # price_change < -2.0 (Fiyat Düşüyor)
+        ("📉 Whale Driven Dump", 10.0, None),
+        ("😨 Retail Panic Sell", 0.0, None),
+        ("🧠 Whales Absorbing the Dip", -15.0, "Smart money buying the dip."),
+    ),
+    (  # -2.0 <= price_change <= 2.0 (Yatay)
+        ("Neutral / Low Volatility", 0.0, None),
+        ("Neutral / Low Volatility", 0.0, None),
+        ("Neutral / Low Volatility", 0.0, None),
+    ),
+    (  # price_change > 2.0 (Fiyat Yükseliyor)
+        ("⚠️ Divergence: Whales Selling into Pump", 25.0, "Exit liquidity trap detected."),
+        ("👥 Organic/Retail Rally", 0.0, None),
+        ("🐳 Whale Driven Pump", 0.0, None),
+    ),
+)
+
+# Dağılım statüsü ve balina baskısı için (risk_delta, opsiyonel açıklama)
+# tabloları; elif merdivenleri yerine tek dict lookup.
+_DIST_SCORES = {
+    "Critical Centralization": (40.0, "Extreme centralization."),
+    "High Concentration": (30.0, "High holder concentration."),
+    "Moderate Concentration": (15.0, None),
+}
+
+_PRESSURE_SCORES = {
+    "Strong Distribution": (25.0, "Whales dumping."),
+    "Distribution": (15.0, None),
+}
+
+@dataclass(slots=True, frozen=True)
+class _Ctx:
+    """Girdi dict'lerinden tek seferde çıkarılan tipli skorlama bağlamı.
+
+    Sıcak yol dict.get yerine slot attribute erişimi kullanır.
+    """
+    pressure: str
+    bundle_detected: bool
+    whale_flow: float
+    slope: float
+    price_change: float
+
+    @classmethod
+    def from_dicts(cls, whale: Mapping, dominance: Mapping, price: Mapping) -> "_Ctx":
+        return cls(
+            whale.get("pressure", "Neutral"),
+            whale.get("bundle_detected", False),
+            whale.get("net_flow_percent_supply", 0.0),
+            dominance.get("slope", 0.0),
+            price.get("price_change_1h", 0.0),
+        )
+
 def generate_behavior_verdict(
     distribution_status: str,
     whale_data: Dict[str, Any],
     dominance_data: Dict[str, Any],
-    price_data: Dict[str, Any] = {} 
+    price_data: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Risk Skorunu Hesaplar. 
     Fiyat hareketi ile Balina hareketini karşılaştırır.
     """
     
+    if price_data is None:
+        price_data = _EMPTY
+
     risk_score = 0.0
-    verdict_desc = []
+    # En fazla 5 açıklama üretilebilir; yeniden boyutlandırma olmasın diye
+    # liste baştan ayrılır ve bir indeks sayacıyla doldurulur.
+    verdict_desc = [None] * 5
+    n_desc = 0
     
+    # --- GİRDİLERİ TEK SEFERDE BAĞLAMA ÇEK ---
+    ctx = _Ctx.from_dicts(whale_data, dominance_data, price_data)
+
     # --- 1. YAPISAL RİSK (Max 40 Puan) ---
-    if distribution_status == "Critical Centralization":
-        risk_score += 40
-        verdict_desc.append("Extreme centralization.")
-    elif distribution_status == "High Concentration":
-        risk_score += 30
-        verdict_desc.append("High holder concentration.")
-    elif distribution_status == "Moderate Concentration":
-        risk_score += 15
-    
+    delta, desc = _DIST_SCORES.get(distribution_status, (0.0, None))
+    risk_score += delta
+    if desc is not None:
+        verdict_desc[n_desc] = desc
+        n_desc += 1
+
     # --- 2. BALİNA & BUNDLE RİSKİ (Max 50 Puan) ---
-    pressure = whale_data.get("pressure", "Neutral")
-    bundle_detected = whale_data.get("bundle_detected", False)
-    
     # Bundle varsa direkt yüksek risk
-    if bundle_detected:
+    if ctx.bundle_detected:
         risk_score += 50
-        verdict_desc.append("🚨 INSIDER BUNDLE DETECTED.")
-    
+        verdict_desc[n_desc] = "🚨 INSIDER BUNDLE DETECTED."
+        n_desc += 1
+
     # Satış baskısı
-    if pressure == "Strong Distribution":
-        risk_score += 25
-        verdict_desc.append("Whales dumping.")
-    elif pressure == "Distribution":
-        risk_score += 15
+    delta, desc = _PRESSURE_SCORES.get(ctx.pressure, (0.0, None))
+    risk_score += delta
+    if desc is not None:
+        verdict_desc[n_desc] = desc
+        n_desc += 1
 
     # --- 3. DOMINANCE RİSKİ (Max 20 Puan) ---
-    slope = dominance_data.get("slope", 0.0)
-    if slope > 0.5:
+    if ctx.slope > 0.5:
         risk_score += 20
-        verdict_desc.append("Top holder accumulating fast.")
+        verdict_desc[n_desc] = "Top holder accumulating fast."
+        n_desc += 1
 
     # --- 4. FİYAT KORELASYONU (NEDENSELLİK) ---
     # Fiyatı kim hareket ettiriyor?
     
-    price_change = price_data.get("price_change_1h", 0.0)
-    whale_flow = whale_data.get("net_flow_percent_supply", 0.0)
-    
-    correlation_verdict = "Neutral / Low Volatility"
-
-    if price_change > 2.0: # Fiyat Yükseliyor
-        if whale_flow > 0.1:
-            correlation_verdict = "🐳 Whale Driven Pump"
-            # Balina destekli yükseliş (Normal risk)
-        elif whale_flow < -0.1:
-            correlation_verdict = "⚠️ Divergence: Whales Selling into Pump"
-            # Fiyat artarken balina satıyor -> ÇOK RİSKLİ (Tuzak)
-            risk_score += 25
-            verdict_desc.append("Exit liquidity trap detected.")
-        else:
-            correlation_verdict = "👥 Organic/Retail Rally"
-            
-    elif price_change < -2.0: # Fiyat Düşüyor
-        if whale_flow < -0.1:
-            correlation_verdict = "📉 Whale Driven Dump"
-            # Balina satıyor, fiyat düşüyor
-            risk_score += 10
-        elif whale_flow > 0.1:
-            correlation_verdict = "🧠 Whales Absorbing the Dip"
-            # Fiyat düşerken balina topluyor -> İYİ SİNYAL
-            risk_score -= 15 # Riski düşür
-            verdict_desc.append("Smart money buying the dip.")
-        else:
-            correlation_verdict = "😨 Retail Panic Sell"
+    # İşaret indeksleri: 0 = negatif bölge, 1 = nötr bant, 2 = pozitif bölge
+    pi = (ctx.price_change > 2.0) - (ctx.price_change < -2.0) + 1
+    wi = (ctx.whale_flow > 0.1) - (ctx.whale_flow < -0.1) + 1
+
+    correlation_verdict, corr_delta, corr_desc = _CORR_TABLE[pi][wi]
+    risk_score += corr_delta
+    if corr_desc is not None:
+        verdict_desc[n_desc] = corr_desc
+        n_desc += 1
 
     # --- SKORLAMA VE ETİKET ---
     risk_score = min(100.0, max(0.0, risk_score))
@@ -98,7 +143,7 @@ def generate_behavior_verdict(
         label = "🟢 STABLE / HEALTHY"
         intensity = "Low"
 
-    full_desc = " ".join(verdict_desc) if verdict_desc else "No major anomalies detected."
+    full_desc = " ".join(verdict_desc[:n_desc]) if n_desc else "No major anomalies detected."
 
     return {
         "risk_score": round(risk_score, 2),
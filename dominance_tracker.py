@@ -1,17 +1,42 @@
-import json
+import atexit
+import asyncio
+import fcntl
 import os
+import struct
 import time
 import math
 import logging
-import errno
+from collections import deque
+
+import numpy as np
+import orjson
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    # Numba opsiyonel: kurulamayan ortamlarda NumPy yolu kullanılır
+    _HAS_NUMBA = False
 from contextlib import contextmanager
 from typing import Dict, List, Any
 
 # --- CONFIGURATION ---
-SNAPSHOT_FILE = "dominance_snapshot.json"
+LEGACY_SNAPSHOT_FILE = "dominance_snapshot.json"
+SNAPSHOT_DIR = "snapshots"
 LOCK_FILE = "dominance.lock"
 HISTORY_LIMIT = 10  # Her token için son 10 analizi sakla
 
+# Sabit boyutlu binary kayıt: timestamp (int64) + yüzde (float64) = 16 bayt
+_RECORD = struct.Struct("<qd")
+# Aynı layout'un NumPy karşılığı: okuma tarafında parse yok, sadece cast var
+_REC_DTYPE = np.dtype([("ts", "<i8"), ("val", "<f8")])
+# Kirli mint'ler en geç bu aralıkla diske yazılır
+_FLUSH_INTERVAL = 30.0
+# Aynı değer bu süre içinde tekrar raporlanırsa yeni örnek alınmaz
+_MIN_SAMPLE_INTERVAL = 60
+# Bellekte tutulacak maksimum mint sayısı; fazlası diske flush'lı şekilde atılır
+_MEM_DB_LIMIT = 1024
+
 # --- LOGGING ---
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
@@ -23,156 +48,259 @@ logger = logging.getLogger("DominanceTracker")
 @contextmanager
 def atomic_lock():
     """
-    OS-Level Atomic Spinlock.
-    Uses O_CREAT | O_EXCL to ensure true mutual exclusion.
+    Kernel-level advisory lock (fcntl.flock).
+    Bloklayan LOCK_EX: polling yok, süreç ölürse kilit otomatik bırakılır,
+    bayat kilit dosyası kırma mantığına gerek kalmaz.
     """
-    timeout = 5.0
-    start_time = time.time()
-    lock_fd = None
-    
-    while True:
-        try:
-            # os.O_EXCL: Dosya varsa hata fırlatır (Atomik İşlem)
-            lock_fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_RDWR)
-            break
-        except OSError as e:
-            if e.errno == errno.EEXIST:
-                # Dosya kilitli, bekle
-                if time.time() - start_time > timeout:
-                    # Deadlock koruması: Kilit çok eskiyse kır
-                    try:
-                        if os.path.exists(LOCK_FILE) and (time.time() - os.path.getmtime(LOCK_FILE) > timeout):
-                            logger.warning("Breaking stale lock.")
-                            os.remove(LOCK_FILE)
-                    except OSError:
-                        pass
-                    # Tekrar dene
-                    continue
-                time.sleep(0.1)
-            else:
-                # Başka bir hata varsa
-                raise
-    
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
     try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
         yield
     finally:
-        # Kilidi temizle
-        if lock_fd is not None:
-            os.close(lock_fd)
-        try:
-            os.remove(LOCK_FILE)
-        except OSError:
-            pass
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
 
 # --- DATABASE OPERATIONS ---
-def _load_db() -> Dict:
-    if not os.path.exists(SNAPSHOT_FILE):
-        return {}
+def _mint_path(mint: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{mint}.bin")
+
+def _read_history(mint: str) -> List[Dict]:
+    """Mint'e ait son kayıtları binary log'dan okur (JSON parse yok)."""
     try:
-        with open(SNAPSHOT_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def _save_db(data: Dict):
-    # Atomik yazma: Önce .tmp'ye yaz, sonra rename et
-    tmp = f"{SNAPSHOT_FILE}.tmp"
+        with open(_mint_path(mint), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+
+    # Yarım kalmış kaydı (crash artığı) yoksay; bytes doğrudan struct
+    # array'e cast edilir, satır satır unpack yok
+    n = len(data) // _RECORD.size
+    if n == 0:
+        return []
+    arr = np.frombuffer(data, dtype=_REC_DTYPE, count=n)[-HISTORY_LIMIT:]
+    return [{"ts": int(r["ts"]), "val": float(r["val"])} for r in arr]
+
+def _write_history(mint: str, records) -> None:
+    """Mint geçmişini atomik olarak yazar (tmp -> rename)."""
+    path = _mint_path(mint)
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            for h in records:
+                f.write(_RECORD.pack(h["ts"], h["val"]))
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.error("Snapshot Write Failed (%s): %s", mint, e)
+
+# --- IN-MEMORY RING BUFFER ---
+# Sıcak yol diske hiç dokunmaz: güncellemeler mint başına deque'te birikir,
+# kirli mint'ler periyodik olarak topluca flush edilir.
+_MEM_DB: Dict[str, deque] = {}
+_DIRTY: set = set()
+_last_flush = time.monotonic()
+_flusher_task = None
+
+def _get_history(mint: str) -> deque:
+    history = _MEM_DB.get(mint)
+    if history is None:
+        _evict_if_needed()
+        history = deque(_read_history(mint), maxlen=HISTORY_LIMIT)
+        _MEM_DB[mint] = history
+    return history
+
+def _evict_if_needed() -> None:
+    """Cache sınırı aşıldıysa temiz (flush edilmiş) girdileri atar.
+
+    Toplam mint sayısı sınırsız büyüyebilir; bellek kullanımı aktif
+    izlenen mint'lerle sınırlı kalır. Atılan girdiler bir sonraki
+    erişimde kendi binary dosyalarından geri yüklenir.
+    """
+    if len(_MEM_DB) < _MEM_DB_LIMIT:
+        return
+    for key in list(_MEM_DB.keys()):
+        if key not in _DIRTY:
+            del _MEM_DB[key]
+            if len(_MEM_DB) < _MEM_DB_LIMIT:
+                break
+
+def _flush_dirty() -> None:
+    """Kirli mint'lerin geçmişlerini diske yazar."""
+    global _last_flush
+    if not _DIRTY:
+        return
+    pending = list(_DIRTY)
+    _DIRTY.clear()
+    with atomic_lock():
+        for mint in pending:
+            history = _MEM_DB.get(mint)
+            if history:
+                _write_history(mint, history)
+    _last_flush = time.monotonic()
+
+async def _flusher() -> None:
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL)
+        try:
+            _flush_dirty()
+        except Exception as e:
+            logger.error("Snapshot Flush Failed: %s", e)
+
+def _ensure_flusher() -> None:
+    """Event loop varsa arka plan flusher'ı başlatır; yoksa inline flush eder."""
+    global _flusher_task
+    if _flusher_task is not None and not _flusher_task.done():
+        return
     try:
-        with open(tmp, 'w') as f:
-            json.dump(data, f, indent=4)
-        os.replace(tmp, SNAPSHOT_FILE)
-    except Exception as e:
-        logger.error(f"Database Save Failed: {e}")
+        loop = asyncio.get_running_loop()
+        _flusher_task = loop.create_task(_flusher())
+    except RuntimeError:
+        # Senkron bağlam (script/test): aralık dolduysa hemen yaz
+        if time.monotonic() - _last_flush >= _FLUSH_INTERVAL:
+            _flush_dirty()
+
+atexit.register(_flush_dirty)
+
+def _migrate_legacy_snapshot():
+    """Eski tek dosyalık JSON snapshot'ı mint başına binary log'a taşır."""
+    if not os.path.exists(LEGACY_SNAPSHOT_FILE):
+        return
+    try:
+        with open(LEGACY_SNAPSHOT_FILE, 'rb') as f:
+            db = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return
+
+    migrated = 0
+    for mint, history in db.items():
+        path = _mint_path(mint)
+        if os.path.exists(path):
+            continue
+        try:
+            with open(path, 'wb') as f:
+                for h in history[-HISTORY_LIMIT:]:
+                    f.write(_RECORD.pack(int(h["ts"]), float(h["val"])))
+            migrated += 1
+        except (OSError, KeyError, TypeError, ValueError):
+            continue
+
+    try:
+        os.replace(LEGACY_SNAPSHOT_FILE, f"{LEGACY_SNAPSHOT_FILE}.bak")
+        logger.info("Migrated %s mints to binary snapshot log.", migrated)
+    except OSError:
+        pass
+
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+_migrate_legacy_snapshot()
 
 # --- ANALYTICS ENGINE ---
-def calculate_slope(history: List[Dict]) -> float:
-    """Doğrusal regresyon ile trend eğimini hesaplar."""
-    if len(history) < 2: return 0.0
-    
-    # x = zaman (saat cinsinden normalize), y = yüzde
-    start_time = history[0]['ts']
-    x = [(h['ts'] - start_time) / 3600.0 for h in history]
-    y = [h['val'] for h in history]
-    
-    n = len(x)
-    sum_x = sum(x)
-    sum_y = sum(y)
-    sum_xy = sum(xi*yi for xi, yi in zip(x, y))
-    sum_xx = sum(xi**2 for xi in x)
-    
-    denominator = (n * sum_xx - sum_x**2)
-    if denominator == 0: return 0.0
-    
-    slope = (n * sum_xy - sum_x * sum_y) / denominator
-    return slope
-
-def calculate_volatility(history: List[Dict]) -> float:
-    """Top 1 cüzdanın standart sapmasını (oynaklığını) hesaplar."""
-    if len(history) < 2: return 0.0
-    vals = [h['val'] for h in history]
-    mean = sum(vals) / len(vals)
-    variance = sum((x - mean) ** 2 for x in vals) / len(vals)
-    return math.sqrt(variance)
+if _HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _dom_metrics_kernel(ts, y):
+        """Eğim + oynaklığı tek füzyonlu döngüde hesaplar (SIMD dostu)."""
+        n = ts.shape[0]
+        t0 = ts[0]
+        sum_x = 0.0
+        sum_y = 0.0
+        sum_xy = 0.0
+        sum_xx = 0.0
+        sum_y2 = 0.0
+        for i in range(n):
+            x = (ts[i] - t0) / 3600.0
+            yi = y[i]
+            sum_x += x
+            sum_y += yi
+            sum_xy += x * yi
+            sum_xx += x * x
+            sum_y2 += yi * yi
+        denominator = n * sum_xx - sum_x * sum_x
+        slope = 0.0
+        if denominator != 0.0:
+            slope = (n * sum_xy - sum_x * sum_y) / denominator
+        mean = sum_y / n
+        var = sum_y2 / n - mean * mean
+        if var < 0.0:
+            var = 0.0
+        return slope, math.sqrt(var)
+
+    # JIT ısındırma: ilk gerçek analiz derleme maliyeti ödemesin
+    _warmup = np.array([0.0, 1.0])
+    _dom_metrics_kernel(_warmup, _warmup)
+
+def _dom_metrics(ts: np.ndarray, vals: np.ndarray):
+    """Doğrusal regresyon eğimi ve standart sapmayı birlikte döner."""
+    if ts.shape[0] < 2:
+        return 0.0, 0.0
+
+    if _HAS_NUMBA:
+        slope, vol = _dom_metrics_kernel(ts, vals)
+        return float(slope), float(vol)
+
+    # NumPy fallback: closed-form cov/var + std
+    x = (ts - ts[0]) * (1.0 / 3600.0)
+    xm = x.mean()
+    ym = vals.mean()
+    denominator = ((x - xm) ** 2).sum()
+    slope = 0.0 if denominator == 0 else float(((x - xm) * (vals - ym)).sum() / denominator)
+    return slope, float(vals.std())
 
 # --- MAIN LOGIC ---
 def calculate_dominance_shift(mint: str, current_top1: float) -> Dict[str, Any]:
     """
     En büyük cüzdanın zaman içindeki değişimini takip eder ve yorumlar.
     """
-    with atomic_lock():
-        db = _load_db()
-        now = int(time.time())
-        
-        if mint not in db:
-            db[mint] = []
-        
-        history = db[mint]
-        
-        # Yeni veriyi ekle
+    now = int(time.time())
+
+    # Sıcak yolda kilit ve disk I/O yok: bellekteki ring buffer güncellenir,
+    # flush arka planda toplu yapılır.
+    history = _get_history(mint)
+
+    # Upstream aynı holder yüzdesini kısa aralıkla tekrar raporlayabilir;
+    # değişmeyen değer için örnek eklemek de diski kirletmek de gereksiz.
+    last = history[-1] if history else None
+    if (last is None
+            or abs(last["val"] - current_top1) >= 1e-9
+            or now - last["ts"] >= _MIN_SAMPLE_INTERVAL):
         history.append({"ts": now, "val": current_top1})
-        
-        # Geçmişi sınırla (Disk tasarrufu)
-        if len(history) > HISTORY_LIMIT:
-            history = history[-HISTORY_LIMIT:]
-        
-        db[mint] = history
-        _save_db(db)
-        
-        # Yetersiz veri durumu
-        if len(history) < 2:
-            return {
-                "previous_top1": 0.0,
-                "current_top1": current_top1,
-                "shift": 0.0,
-                "slope": 0.0,
-                "volatility": 0.0,
-                "regime": "Initial",
-                "status": "First Record"
-            }
-        
-        # Metrik Hesaplamaları
-        prev_val = history[-2]['val']
-        shift = current_top1 - prev_val
-        slope = calculate_slope(history)
-        volatility = calculate_volatility(history)
-        
-        # Rejim Tespiti (Piyasa Durumu)
-        if slope > 0.5: regime = "Aggressive Consolidation"
-        elif slope < -0.5: regime = "Rapid Dilution"
-        elif volatility > 2.0: regime = "Volatile Reallocation"
-        else: regime = "Stable"
-        
-        # Statü Tespiti
-        status = "Stable"
-        if shift > 2.0: status = "Accumulation"
-        elif shift < -2.0: status = "Distribution"
-        
+        _DIRTY.add(mint)
+        _ensure_flusher()
+
+    # Yetersiz veri durumu
+    if len(history) < 2:
         return {
-            "previous_top1": prev_val,
+            "previous_top1": 0.0,
             "current_top1": current_top1,
-            "shift": round(shift, 2),
-            "slope": round(slope, 4),
-            "volatility": round(volatility, 2),
-            "regime": regime,
-            "status": status
-        }
\ No newline at end of file
+            "shift": 0.0,
+            "slope": 0.0,
+            "volatility": 0.0,
+            "regime": "Initial",
+            "status": "First Record"
+        }
+
+    # Metrik Hesaplamaları (Tek NumPy geçişi, Python döngüsü yok)
+    arr = np.asarray([(h['ts'], h['val']) for h in history], dtype=np.float64)
+    prev_val = history[-2]['val']
+    shift = current_top1 - prev_val
+    slope, volatility = _dom_metrics(arr[:, 0], arr[:, 1])
+
+    # Rejim Tespiti (Piyasa Durumu)
+    if slope > 0.5: regime = "Aggressive Consolidation"
+    elif slope < -0.5: regime = "Rapid Dilution"
+    elif volatility > 2.0: regime = "Volatile Reallocation"
+    else: regime = "Stable"
+
+    # Statü Tespiti
+    status = "Stable"
+    if shift > 2.0: status = "Accumulation"
+    elif shift < -2.0: status = "Distribution"
+
+    # Ham değerler döner: yuvarlama sadece gösterim katmanının işi,
+    # eşik karşılaştırmaları (ör. slope > 0.5) tam hassasiyetle çalışır.
+    return {
+        "previous_top1": prev_val,
+        "current_top1": current_top1,
+        "shift": shift,
+        "slope": slope,
+        "volatility": volatility,
+        "regime": regime,
+        "status": status
+    }
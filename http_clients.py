@@ -0,0 +1,43 @@
+import asyncio
+import atexit
+import os
+
+import httpx
+
+# --- CONFIGURATION ---
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+# Host sınıfı başına ayrı client: yavaş bir Telegram webhook'u RPC
+# havuzunun keep-alive slotunu kilitleyemez; her host kendi bağlantı
+# havuzunu ve kendine uygun timeout'ları kullanır. Helius RPC client'ları
+# kendi sahiplerinde yaşar (PaymentEngine / WhaleEngine / FastAPI lifespan):
+# rate limiter ve yaşam döngüleri oraya bağlı.
+
+# Telegram Bot API: düşük hacim, bildirim gecikmesine tolerans var
+telegram_client = httpx.AsyncClient(
+    base_url=f"https://api.telegram.org/bot{BOT_TOKEN}",
+    timeout=httpx.Timeout(10.0),
+    limits=httpx.Limits(max_keepalive_connections=5, max_connections=20),
+)
+
+# DexScreener: tek GET endpoint'i, kısa timeout yeterli
+dex_client = httpx.AsyncClient(
+    base_url="https://api.dexscreener.com",
+    timeout=httpx.Timeout(10.0),
+    limits=httpx.Limits(max_keepalive_connections=10, max_connections=40),
+)
+
+_ALL_CLIENTS = (telegram_client, dex_client)
+
+async def aclose_all() -> None:
+    """Tüm paylaşılan clientları kapatır (lifespan/shutdown için)."""
+    await asyncio.gather(*(c.aclose() for c in _ALL_CLIENTS))
+
+def _atexit_close() -> None:
+    # Event loop çoktan kapanmış olabilir; en iyi çabayla kapat
+    try:
+        asyncio.run(aclose_all())
+    except RuntimeError:
+        pass
+
+atexit.register(_atexit_close)
@@ -1,9 +1,11 @@
 import os
+import re
 import logging
 import httpx
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.constants import ParseMode
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
@@ -44,8 +46,140 @@ logger = logging.getLogger("TheRugScopeBot")
 # --- STATES ---
 WAITING_FOR_WALLET = 1
 
+# Solana adresi: Base58 alfabesi, 32-44 karakter (çapa + karakter sınıfı,
+# backtracking yok). Base58 decode etmeden hızlı ön eleme.
+_B58_RE = re.compile(r"^[1-9A-HJ-NP-Za-km-z]{32,44}$")
+
+# --- SHARED HTTP CLIENT ---
+# Her /check için yeni AsyncClient kurmak TCP el sıkışmasını her seferinde
+# ödetir; tek havuzlu istemci bağlantıları keep-alive ile yeniden kullanır.
+http_client = httpx.AsyncClient(
+    timeout=60.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+)
+
+async def _close_http_client(app) -> None:
+    await http_client.aclose()
+
+# --- STATIC MESSAGE TEMPLATES ---
+# Her mesajda ~500 baytlık f-string'i yeniden kurmamak için sabitler
+# import anında bir kez oluşturulur.
+
+_START_PREFIX = (
+    "🤖 **TheRugScopeBot v2.9.3**\n"
+    "**Account Status:** `"
+)
+_START_SUFFIX = (
+    "`\n\n"
+    "Welcome to the institutional-grade risk analysis tool for Solana.\n"
+    "We detect what DexScreener hides.\n\n"
+    "🚀 **COMMANDS:**\n"
+    "🔹 `/check <Mint>` - Analyze a token\n"
+    "🔹 `/upgrade` - Unlock Forensic Features\n"
+    "🔹 `/help` - Documentation & Support\n\n"
+    "_Select a command to begin._"
+)
+
+HELP_MSG = (
+    "📚 **USER GUIDE & SUPPORT**\n\n"
+    "**1. HOW TO ANALYZE?**\n"
+    "Send the token address (Mint ID) or use:\n"
+    "`/check <Mint_Address>`\n\n"
+    "**2. RISK LEVELS EXPLAINED**\n"
+    "🟢 **Low Risk:** Healthy distribution, no bundles.\n"
+    "🟡 **Medium Risk:** Moderate concentration.\n"
+    "🟠 **High Risk:** Whale dominance or suspicious flow.\n"
+    "⛔ **Critical:** Insider Bundles, Mint Authority enabled, or Scam detected.\n\n"
+    "**3. PREMIUM FEATURES**\n"
+    "• **Bundle Detection:** Finds linked wallets (Insiders).\n"
+    "• **Causality:** Did a whale pump the price?\n"
+    "• **Security:** Mint/Freeze authority checks.\n\n"
+    "**4. CONTACT & SUPPORT**\n"
+    "For billing issues or bug reports:\n"
+    f"📧 **Email:** `{SUPPORT_EMAIL}`\n\n"
+    "_TheRugScopeBot is an analysis tool, not financial advice._"
+)
+
+UPGRADE_MSG = (
+    "💎 **PREMIUM SUBSCRIPTION**\n\n"
+    "Unlock the forensic power used by smart money:\n\n"
+    "✅ **Insider Bundle Detection** (Anti-Rug)\n"
+    "✅ **Price Causality** (Whale vs Retail)\n"
+    "✅ **Full Security Audit** (Mint/Freeze)\n"
+    "✅ **Unlimited Daily Scans**\n\n"
+    "──────────────\n"
+    "💵 **Price:** $4.99 / Month\n"
+    "💳 **Method:** USDT / USDC (Solana)\n"
+    "──────────────\n\n"
+    "👇 **To generate an invoice, please reply with your SOLANA WALLET ADDRESS:**"
+)
+
+INVOICE_MSG = (
+    "🧾 **PAYMENT INVOICE GENERATED**\n\n"
+    "Please send exactly **4.99 USDT** or **4.99 USDC** to the address below:\n\n"
+    f"`{MASTER_WALLET}`\n"
+    "_(Tap address to copy)_\n\n"
+    "⚠️ **IMPORTANT INSTRUCTIONS:**\n"
+    "1. Network: **Solana (SPL)** ONLY.\n"
+    "2. Sender: Must be the wallet you just provided.\n"
+    "3. Activation: Automatic (1-2 mins after tx)."
+)
+
+_FREE_LOCKED_BLOCK = (
+    "🔒 **PREMIUM INSIGHTS LOCKED:**\n"
+    "• 🧠 Trend Causality (Whale vs Community)\n"
+    "• 🕵️ Insider Bundle Detection\n"
+    "• 🔒 Full Security Audit\n\n"
+    "💡 _Upgrade to unlock forensic tools._\n"
+)
+
 # --- REPORT FORMATTING ---
 
+# Bool -> statik değer seçimleri için tablolar (dallanma yerine indeksleme)
+_PRICE_EMOJI = ("📉", "📈")
+_MINT_AUTH_TXT = ("⚠️ **RISK: Mintable**", "✅ Safe")
+
+# Risk seviyesi -> rozet eşlemesi (if/elif merdiveni yerine tek lookup)
+_BADGES = {
+    "Low": "🟢 LOW RISK",
+    "Medium": "🟡 MEDIUM RISK",
+    "High": "🟠 HIGH RISK",
+    "Critical": "⛔ CRITICAL RISK",
+}
+
+_PREMIUM_TEMPLATE = (
+    "🛡️ **INSTITUTIONAL RISK REPORT**\n"
+    "**Ref:** `{mint}`\n\n"
+    "**RISK LEVEL:** {badge}\n"
+    "**SUPPLY SCORE:** {score}/100\n\n"
+    "💰 **MARKET ACTION (1H)**\n"
+    "• Price: `{price_line}`\n"
+    "• MC: `${market_cap:,.0f}`\n"
+    "• Trend Cause: `{trend_cause}`\n\n"
+    "🕵️ **FORENSIC ANALYSIS**\n"
+    "• Bundles: {bundle_txt}\n"
+    "• Mint Auth: {mint_auth}\n\n"
+    "📊 **DISTRIBUTION**\n"
+    "• Top 10 Hold: `{top10_percent:.2f}%`\n"
+    "• HHI Score: `{hhi_estimate}`\n\n"
+    "🐋 **WHALE ACTIVITY**\n"
+    "• Pressure: `{pressure}`\n"
+    "• Flow: `{net_flow:.2f}%`\n\n"
+    "📝 **VERDICT**\n"
+    "{verdict_label}\n"
+    "_{verdict_description}_"
+)
+
+_FREE_TEMPLATE = (
+    "🛡️ **BASIC RISK REPORT**\n"
+    "**Ref:** `{mint}`\n\n"
+    "💰 **PRICE:** ${price_usd:.6f} ({p_emoji} {price_change:.2f}%)\n"
+    "**SUPPLY SCORE:** {score}/100\n\n"
+    + _FREE_LOCKED_BLOCK.replace("{", "{{").replace("}", "}}") +
+    "📉 **Daily Usage:** {usage}/5\n"
+    "👉 `/upgrade`"
+)
+
 def format_premium_report(data: dict, mint: str) -> str:
     """Premium Rapor Formatı"""
     struct = data.get("structural", {})
@@ -55,70 +189,57 @@ def format_premium_report(data: dict, mint: str) -> str:
     verdict = data.get("verdict", {})
     metrics = struct.get("metrics", {})
 
-    risk_level = verdict.get("risk_intensity", "Medium")
-    badge = "🟡 MEDIUM RISK"
-    if risk_level == "Low": badge = "🟢 LOW RISK"
-    elif risk_level == "High": badge = "🟠 HIGH RISK"
-    elif risk_level == "Critical": badge = "⛔ CRITICAL RISK"
+    badge = _BADGES.get(verdict.get("risk_intensity", "Medium"), "🟡 MEDIUM RISK")
 
     if sec.get("mint_authority"): badge = "⛔ CRITICAL (MINTABLE)"
     if whale.get("bundle_detected"): badge = "⛔ CRITICAL (BUNDLE)"
 
-    mint_auth = "✅ Safe" if not sec.get("mint_authority") else "⚠️ **RISK: Mintable**"
-    
+    mint_auth = _MINT_AUTH_TXT[not sec.get("mint_authority")]
+
     bundle_txt = "✅ Clean"
     if whale.get("bundle_detected"):
         bundle_txt = f"🚨 **WARNING: {whale.get('bundle_size')} Wallets Linked!**"
 
     p_usd = price.get("price_usd", 0)
-    p_emoji = "📈" if price.get("price_change_1h", 0) >= 0 else "📉"
-    price_line = f"${p_usd:.6f} ({p_emoji} {price.get('price_change_1h', 0):.2f}%)"
+    pc = price.get("price_change_1h", 0)
+    price_line = f"${p_usd:.6f} ({_PRICE_EMOJI[pc >= 0]} {pc:.2f}%)"
     if not price.get("found"): price_line = "N/A"
 
-    trend_cause = verdict.get('correlation_verdict', 'Neutral')
-
-    return (
-        f"🛡️ **INSTITUTIONAL RISK REPORT**\n"
-        f"**Ref:** `{mint}`\n\n"
-        f"**RISK LEVEL:** {badge}\n"
-        f"**SUPPLY SCORE:** {struct.get('score')}/100\n\n"
-        f"💰 **MARKET ACTION (1H)**\n"
-        f"• Price: `{price_line}`\n"
-        f"• MC: `${price.get('market_cap', 0):,.0f}`\n"
-        f"• Trend Cause: `{trend_cause}`\n\n"
-        f"🕵️ **FORENSIC ANALYSIS**\n"
-        f"• Bundles: {bundle_txt}\n"
-        f"• Mint Auth: {mint_auth}\n\n"
-        f"📊 **DISTRIBUTION**\n"
-        f"• Top 10 Hold: `{metrics.get('top10_percent', 0):.2f}%`\n"
-        f"• HHI Score: `{metrics.get('hhi_estimate', 'N/A')}`\n\n"
-        f"🐋 **WHALE ACTIVITY**\n"
-        f"• Pressure: `{whale.get('pressure', 'Neutral')}`\n"
-        f"• Flow: `{whale.get('net_flow_percent_supply', 0):.2f}%`\n\n"
-        f"📝 **VERDICT**\n"
-        f"{verdict.get('verdict_label')}\n"
-        f"_{verdict.get('verdict_description')}_"
-    )
+    # Tek düzleştirilmiş params dict + önceden derlenmiş şablon:
+    # her mesajda f-string'i yeniden kurmak yerine format_map çağrısı.
+    params = {
+        "mint": mint,
+        "badge": badge,
+        "score": struct.get("score"),
+        "price_line": price_line,
+        "market_cap": price.get("market_cap", 0),
+        "trend_cause": verdict.get("correlation_verdict", "Neutral"),
+        "bundle_txt": bundle_txt,
+        "mint_auth": mint_auth,
+        "top10_percent": metrics.get("top10_percent", 0),
+        "hhi_estimate": metrics.get("hhi_estimate", "N/A"),
+        "pressure": whale.get("pressure", "Neutral"),
+        "net_flow": whale.get("net_flow_percent_supply", 0),
+        "verdict_label": verdict.get("verdict_label"),
+        "verdict_description": verdict.get("verdict_description"),
+    }
+    return _PREMIUM_TEMPLATE.format_map(params)
 
 def format_free_report(data: dict, mint: str, usage: int) -> str:
     """Free Rapor Formatı"""
     struct = data.get("structural", {})
     price = data.get("price_data", {})
-    p_emoji = "📈" if price.get("price_change_1h", 0) >= 0 else "📉"
-    
-    return (
-        f"🛡️ **BASIC RISK REPORT**\n"
-        f"**Ref:** `{mint}`\n\n"
-        f"💰 **PRICE:** ${price.get('price_usd', 0):.6f} ({p_emoji} {price.get('price_change_1h', 0):.2f}%)\n"
-        f"**SUPPLY SCORE:** {struct.get('score')}/100\n\n"
-        f"🔒 **PREMIUM INSIGHTS LOCKED:**\n"
-        f"• 🧠 Trend Causality (Whale vs Community)\n"
-        f"• 🕵️ Insider Bundle Detection\n"
-        f"• 🔒 Full Security Audit\n\n"
-        f"💡 _Upgrade to unlock forensic tools._\n"
-        f"📉 **Daily Usage:** {usage}/5\n"
-        f"👉 `/upgrade`"
-    )
+    price_change = price.get("price_change_1h", 0)
+
+    params = {
+        "mint": mint,
+        "price_usd": price.get("price_usd", 0),
+        "p_emoji": _PRICE_EMOJI[price_change >= 0],
+        "price_change": price_change,
+        "score": struct.get("score"),
+        "usage": usage,
+    }
+    return _FREE_TEMPLATE.format_map(params)
 
 # --- ADMIN COMMANDS (YENİ EKLENDİ) ---
 
@@ -170,41 +291,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     perm = user_manager.check_status(user_id, ADMIN_IDS)
     status_icon = "💎 Premium" if perm["type"] in ["Premium", "Admin"] else "👤 Free Plan"
-    
-    msg = (
-        f"🤖 **TheRugScopeBot v2.9.3**\n"
-        f"**Account Status:** `{status_icon}`\n\n"
-        "Welcome to the institutional-grade risk analysis tool for Solana.\n"
-        "We detect what DexScreener hides.\n\n"
-        "🚀 **COMMANDS:**\n"
-        "🔹 `/check <Mint>` - Analyze a token\n"
-        "🔹 `/upgrade` - Unlock Forensic Features\n"
-        "🔹 `/help` - Documentation & Support\n\n"
-        "_Select a command to begin._"
-    )
+
+    # Sadece statü ikonu dinamik; geri kalan şablon import anında hazır
+    msg = "".join((_START_PREFIX, status_icon, _START_SUFFIX))
     await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = (
-        f"📚 **USER GUIDE & SUPPORT**\n\n"
-        "**1. HOW TO ANALYZE?**\n"
-        "Send the token address (Mint ID) or use:\n"
-        "`/check <Mint_Address>`\n\n"
-        "**2. RISK LEVELS EXPLAINED**\n"
-        "🟢 **Low Risk:** Healthy distribution, no bundles.\n"
-        "🟡 **Medium Risk:** Moderate concentration.\n"
-        "🟠 **High Risk:** Whale dominance or suspicious flow.\n"
-        "⛔ **Critical:** Insider Bundles, Mint Authority enabled, or Scam detected.\n\n"
-        "**3. PREMIUM FEATURES**\n"
-        "• **Bundle Detection:** Finds linked wallets (Insiders).\n"
-        "• **Causality:** Did a whale pump the price?\n"
-        "• **Security:** Mint/Freeze authority checks.\n\n"
-        "**4. CONTACT & SUPPORT**\n"
-        "For billing issues or bug reports:\n"
-        f"📧 **Email:** `{SUPPORT_EMAIL}`\n\n"
-        "_TheRugScopeBot is an analysis tool, not financial advice._"
-    )
-    await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
+    await update.message.reply_text(HELP_MSG, parse_mode=ParseMode.MARKDOWN)
 
 async def check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -220,17 +313,21 @@ async def check(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     msg = await update.message.reply_text("⏳ **Initializing Forensic Scan...**")
 
+    mint = context.args[0]
     try:
         user_manager.increment_usage(user_id, ADMIN_IDS)
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.get(f"{API_URL}/analyze/{context.args[0]}")
-            resp.raise_for_status()
-            data = resp.json()
-
-        txt = format_premium_report(data, context.args[0]) if perm["type"] in ["Premium", "Admin"] else format_free_report(data, context.args[0], perm.get("usage", 0)+1)
+        resp = await http_client.get(f"{API_URL}/analyze/{mint}")
+        resp.raise_for_status()
+        data = resp.json()
+
+        # Kullanıcı girdisi Markdown'a ham gömülmez: '_' içeren bir adres
+        # Telegram parser'ını kırar ve mesaj gönderimi reddedilir.
+        safe_mint = escape_markdown(mint, version=1)
+        txt = format_premium_report(data, safe_mint) if perm["type"] in ["Premium", "Admin"] else format_free_report(data, safe_mint, perm.get("usage", 0)+1)
         await msg.edit_text(txt, parse_mode=ParseMode.MARKDOWN)
 
     except Exception:
+        logger.exception("Scan failed for %s", mint)
         await msg.edit_text("⚠️ **Scan Failed:** Please check the token address.")
 
 # --- UPGRADE FLOW ---
@@ -243,27 +340,14 @@ async def upgrade_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("✅ **You are already a Premium Member.**", parse_mode=ParseMode.MARKDOWN)
         return ConversationHandler.END
 
-    msg = (
-        "💎 **PREMIUM SUBSCRIPTION**\n\n"
-        "Unlock the forensic power used by smart money:\n\n"
-        "✅ **Insider Bundle Detection** (Anti-Rug)\n"
-        "✅ **Price Causality** (Whale vs Retail)\n"
-        "✅ **Full Security Audit** (Mint/Freeze)\n"
-        "✅ **Unlimited Daily Scans**\n\n"
-        "──────────────\n"
-        "💵 **Price:** $4.99 / Month\n"
-        "💳 **Method:** USDT / USDC (Solana)\n"
-        "──────────────\n\n"
-        "👇 **To generate an invoice, please reply with your SOLANA WALLET ADDRESS:**"
-    )
-    await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
+    await update.message.reply_text(UPGRADE_MSG, parse_mode=ParseMode.MARKDOWN)
     return WAITING_FOR_WALLET
 
 async def receive_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     wallet = update.message.text.strip()
     user_id = update.effective_user.id
 
-    if len(wallet) < 32:
+    if not _B58_RE.match(wallet):
         await update.message.reply_text("❌ **Invalid Address.** Please try again.")
         return WAITING_FOR_WALLET
 
@@ -273,17 +357,7 @@ async def receive_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     session_manager.create_session(user_id, wallet)
 
-    msg = (
-        "🧾 **PAYMENT INVOICE GENERATED**\n\n"
-        "Please send exactly **4.99 USDT** or **4.99 USDC** to the address below:\n\n"
-        f"`{MASTER_WALLET}`\n"
-        "_(Tap address to copy)_\n\n"
-        "⚠️ **IMPORTANT INSTRUCTIONS:**\n"
-        "1. Network: **Solana (SPL)** ONLY.\n"
-        "2. Sender: Must be the wallet you just provided.\n"
-        "3. Activation: Automatic (1-2 mins after tx)."
-    )
-    await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
+    await update.message.reply_text(INVOICE_MSG, parse_mode=ParseMode.MARKDOWN)
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -293,7 +367,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # --- MAIN ---
 
 if __name__ == '__main__':
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+    application = ApplicationBuilder().token(BOT_TOKEN).post_shutdown(_close_http_client).build()
     
     # 1. Admin Handler Ekleme
     application.add_handler(CommandHandler('addpremium', admin_add_premium))
@@ -1,19 +1,27 @@
 import os
-import json
 import time
 import asyncio
+import itertools
 import logging
 import httpx
+import orjson
+import websockets
+from aiolimiter import AsyncLimiter
+from collections import deque
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Set
 
 # --- MODULE IMPORTS ---
 # Session manager ile ödeyen kişiyi eşleştirmek için gerekli
 from payment_session_manager import session_manager
+# Host başına paylaşılan HTTP clientlar
+from http_clients import telegram_client
 
 # --- CONFIGURATION ---
 HELIUS_API_KEY = os.getenv("HELIUS_API_KEY")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# "1" yapılırsa push yerine eski 30s polling döngüsü kullanılır
+FORCE_POLLING = os.getenv("PAYMENT_FORCE_POLLING", "0") == "1"
 
 # Cüzdan ve Token Sabitleri
 MASTER_WALLET = "GkbSGWwSuiYDddMpM72NVQWFgLny3W1Yh3WxwoA3kY8D"
@@ -24,11 +32,19 @@ ACCEPTED_MINTS = {
     "USDT": "Es9vMFrzaCERmJfrGv2kRkGq5BPdZiZsaAJ2bX7wY8L",
     "USDC": "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
 }
-ACCEPTED_MINT_VALUES = list(ACCEPTED_MINTS.values())
+ACCEPTED_MINT_VALUES = frozenset(ACCEPTED_MINTS.values())
+# Ters harita: mint adresinden para birimine O(1) erişim
+MINT_TO_CURRENCY = {v: k for k, v in ACCEPTED_MINTS.items()}
+# Transfer instruction'ı sayılan SPL program isimleri
+ACCEPTED_PROGRAMS = frozenset({"spl-token", "spl-token-2022"})
 
 # Fiyatlandırma ve Tolerans
 TARGET_PRICE = 4.99
 MIN_ACCEPT_AMOUNT = 4.90  # Fee/Slippage toleransı
+# Aynı eşik atomik birimlerde (USDT/USDC 6 decimal): miktar karşılaştırmaları
+# float yuvarlama hatasına girmeden tam sayı üzerinden yapılır
+STABLE_DECIMALS = 6
+MIN_ACCEPT_ATOMIC = 4_900_000
 PREMIUM_DURATION_SECONDS = 30 * 24 * 60 * 60  # 30 Gün
 
 # Persistence (Kalıcılık) Dosyaları
@@ -42,12 +58,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger("PaymentEngine")
 
+# İşlenmiş tx listesi diske yazılmadan önce beklenen birleştirme süresi
+TX_FLUSH_DEBOUNCE = 5.0
+# ATA listesi bu süre boyunca tekrar sorgulanmaz (saniye)
+ATA_CACHE_TTL = 600.0
+
 class PaymentEngine:
     def __init__(self):
         self._ensure_files()
         self.rpc_url = f"https://mainnet.helius-rpc.com/?api-key={HELIUS_API_KEY}"
-        # RPC çağrıları için tek bir client, timeout süresi uzun tutuldu
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+        # Tek client, açık keep-alive havuzu: TLS el sıkışması istek başına
+        # değil bağlantı başına ödenir. Timeout'lar aşamalara göre ayrıldı.
+        self.http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=5.0, read=25.0, write=10.0, pool=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+
+        # İşlenmiş işlemler bellekte tutulur: set O(1) üyelik, deque son
+        # 2000 kaydı sırayla korur. Disk yazımı debounce ile birleştirilir.
+        self._processed_order: deque = deque(self._load_json(TX_FILE)[-2000:], maxlen=2000)
+        self._processed: set = set(self._processed_order)
+        self._tx_flush_task = None
+        # RPC id üretici: time() tabanlı id saniye içinde çakışabilir,
+        # sayaç her çağrıda benzersiz ve sistem çağrısı gerektirmez
+        self._next_id = itertools.count(1)
+        # Token-bucket: Helius'un kabul ettiği hızda gönder, boşta bekletme
+        self._rate = AsyncLimiter(5, 1)
+        # ATA listesi TTL cache'i: (monotonic zaman, adres listesi)
+        self._ata_cache: Optional[tuple] = None
 
     def _ensure_files(self):
         """Gerekli JSON dosyalarının varlığını garanti eder."""
@@ -57,58 +95,113 @@ class PaymentEngine:
             self._atomic_write(PREMIUM_FILE, {})
 
     def _load_json(self, filename: str) -> Any:
-        """Güvenli JSON okuma."""
+        """Güvenli JSON okuma (orjson: C hızında parse)."""
         try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(filename, 'rb') as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
             return [] if filename == TX_FILE else {}
 
-    def _atomic_write(self, filename: str, data: Any):
-        """Windows uyumlu atomik yazma işlemi (Veri kaybını önler)."""
+    def _atomic_write(self, filename: str, data: Any, durable: bool = False):
+        """Windows uyumlu atomik yazma işlemi (Veri kaybını önler).
+
+        Tek write çağrısı + os.replace. fsync sadece durable=True ile
+        yapılır: premium aktivasyonu gibi kaybolmaması gereken yazımlar
+        için; işlenmiş tx listesi yeniden taramayla kurtarılabilir.
+        """
         temp_file = f"{filename}.tmp"
         try:
-            with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=4)
+            # Makine dosyası: indent süsü gereksiz, orjson binary yazar
+            with open(temp_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE))
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
             os.replace(temp_file, filename)
         except OSError as e:
-            logger.error(f"Critical IO Error ({filename}): {e}")
+            logger.error("Critical IO Error (%s): %s", filename, e)
 
     def _is_processed(self, signature: str) -> bool:
-        """İşlem daha önce işlendi mi?"""
-        txs = self._load_json(TX_FILE)
-        return signature in txs
+        """İşlem daha önce işlendi mi? (O(1) set lookup)"""
+        return signature in self._processed
 
     def _mark_processed(self, signature: str):
-        """İşlemi işlendi olarak işaretle ve listeyi temiz tut."""
-        txs = self._load_json(TX_FILE)
-        if signature not in txs:
-            txs.append(signature)
-            # Dosya şişmesin diye son 2000 işlemi tutuyoruz
-            if len(txs) > 2000:
-                txs = txs[-2000:]
-            self._atomic_write(TX_FILE, txs)
+        """İşlemi işlendi olarak işaretle; diske yazım debounce edilir."""
+        if signature in self._processed:
+            return
+        # deque dolunca en eski kaydı set'ten de düş
+        if len(self._processed_order) == self._processed_order.maxlen:
+            self._processed.discard(self._processed_order.popleft())
+        self._processed_order.append(signature)
+        self._processed.add(signature)
+        self._schedule_tx_flush()
+
+    def _schedule_tx_flush(self):
+        """Kısa aralıklı işaretlemeleri tek disk yazımında birleştirir."""
+        if self._tx_flush_task is not None and not self._tx_flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Event loop yoksa (test/script) hemen yaz
+            self._flush_processed()
+            return
+        self._tx_flush_task = loop.create_task(self._flush_processed_later())
+
+    async def _flush_processed_later(self):
+        await asyncio.sleep(TX_FLUSH_DEBOUNCE)
+        self._flush_processed()
+
+    def _flush_processed(self):
+        self._atomic_write(TX_FILE, list(self._processed_order))
 
     async def _rpc_call(self, method: str, params: list) -> Dict:
         """Helius RPC Çağrısı (Retry Mekanizmalı)."""
         payload = {
             "jsonrpc": "2.0", 
-            "id": int(time.time()), 
+            "id": next(self._next_id), 
             "method": method, 
             "params": params
         }
         
         for attempt in range(3):
             try:
-                response = await self.http_client.post(self.rpc_url, json=payload)
+                async with self._rate:
+                    response = await self.http_client.post(self.rpc_url, json=payload)
                 response.raise_for_status()
-                return response.json()
+                return orjson.loads(response.content)
             except Exception as e:
                 if attempt == 2:
-                    logger.error(f"RPC Fail [{method}]: {e}")
+                    logger.error("RPC Fail [%s]: %s", method, e)
                 await asyncio.sleep(1 * (attempt + 1))
         return {}
 
+    async def _rpc_batch(self, calls: list) -> list:
+        """JSON-RPC array batch: N çağrı tek POST'ta gider.
+
+        Sonuçlar istek sırasına göre döner; cevap gelmeyen id'ler için {}.
+        """
+        if not calls:
+            return []
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+
+        for attempt in range(3):
+            try:
+                async with self._rate:
+                    response = await self.http_client.post(self.rpc_url, json=payload)
+                response.raise_for_status()
+                results = orjson.loads(response.content)
+                by_id = {r.get("id"): r for r in results if isinstance(r, dict)}
+                return [by_id.get(i, {}) for i in range(len(calls))]
+            except Exception as e:
+                if attempt == 2:
+                    logger.error("RPC Batch Fail: %s", e)
+                await asyncio.sleep(1 * (attempt + 1))
+        return [{} for _ in calls]
+
     async def _notify_user(self, user_id: int, expiry_ts: int, currency: str):
         """Kullanıcıya Telegram üzerinden başarı mesajı gönderir."""
         if not BOT_TOKEN: return
@@ -121,16 +214,16 @@ class PaymentEngine:
             f"Valid Until: `{date_str}`\n\n"
             f"Thank you for choosing TheRugScopeBot."
         )
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
         try:
-            await self.http_client.post(url, json={
+            # Telegram trafiği RPC havuzunu işgal etmesin diye ayrı client
+            await telegram_client.post("/sendMessage", json={
                 "chat_id": user_id, 
                 "text": text, 
                 "parse_mode": "Markdown"
             })
-            logger.info(f"Notification sent to User {user_id}")
+            logger.info("Notification sent to User %s", user_id)
         except Exception as e:
-            logger.error(f"Failed to notify user {user_id}: {e}")
+            logger.error("Failed to notify user %s: %s", user_id, e)
 
     def _activate_premium_direct(self, user_id: int) -> int:
         """
@@ -149,14 +242,22 @@ class PaymentEngine:
         new_expiry = base_time + PREMIUM_DURATION_SECONDS
 
         data[uid] = {"active": True, "expires_at": new_expiry}
-        self._atomic_write(PREMIUM_FILE, data)
+        self._atomic_write(PREMIUM_FILE, data, durable=True)
         return new_expiry
 
     async def _get_monitoring_addresses(self) -> List[str]:
         """
         Master Wallet'ı ve ona ait USDT/USDC ATA adreslerini bulur.
         Bu sayede token transferlerini kaçırmayız.
+
+        ATA'lar pratikte değişmediği için sonuç ATA_CACHE_TTL boyunca
+        önbellekten döner; getTokenAccountsByOwner pahalı bir çağrıdır.
         """
+        if self._ata_cache is not None:
+            cached_at, cached = self._ata_cache
+            if time.monotonic() - cached_at < ATA_CACHE_TTL:
+                return cached
+
         addresses = [MASTER_WALLET]
         
         resp = await self._rpc_call("getTokenAccountsByOwner", [
@@ -165,20 +266,30 @@ class PaymentEngine:
             {"encoding": "jsonParsed"}
         ])
         
-        if "result" in resp and "value" in resp["result"]:
-            for account in resp["result"]["value"]:
-                info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
-                mint = info.get("mint")
-                
-                if mint in ACCEPTED_MINT_VALUES:
-                    pubkey = account.get("pubkey")
-                    if pubkey:
-                        addresses.append(pubkey)
+        if "result" not in resp:
+            # RPC başarısız: sakat (yalnız Master Wallet) listeyi 10 dakika
+            # cache'leme; varsa eski liste kullanılmaya devam eder, yoksa
+            # bu tur daraltılmış listeyle geçilir ve bir sonraki çağrı
+            # yeniden dener.
+            if self._ata_cache is not None:
+                return self._ata_cache[1]
+            return addresses
+
+        for account in resp["result"].get("value", []):
+            info = account.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
+            mint = info.get("mint")
+            
+            if mint in ACCEPTED_MINT_VALUES:
+                pubkey = account.get("pubkey")
+                if pubkey:
+                    addresses.append(pubkey)
         
-        # Tekrar edenleri temizle
-        return list(set(addresses))
+        # Tekrar edenleri sıra koruyarak temizle (Master Wallet hep başta)
+        addresses = list(dict.fromkeys(addresses))
+        self._ata_cache = (time.monotonic(), addresses)
+        return addresses
 
-    async def verify_transaction(self, signature: str) -> Optional[int]:
+    async def verify_transaction(self, signature: str, tx_resp: Optional[Dict] = None) -> Optional[int]:
         """
         Bir işlemi analiz eder ve geçerli bir ödeme olup olmadığına karar verir.
         Logic:
@@ -186,11 +297,15 @@ class PaymentEngine:
         2. Master Wallet (veya ATA'sı) para aldı mı?
         3. Kim para gönderdi? (Balance Delta Check)
         4. Gönderen kişinin açık bir oturumu var mı?
+
+        tx_resp verilirse (batch ön-yükleme) ayrıca RPC çağrısı yapılmaz.
         """
-        resp = await self._rpc_call("getTransaction", [
-            signature, 
-            {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0, "commitment": "finalized"}
-        ])
+        resp = tx_resp
+        if resp is None:
+            resp = await self._rpc_call("getTransaction", [
+                signature, 
+                {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0, "commitment": "finalized"}
+            ])
 
         if not resp.get("result"): return None
         tx_data = resp["result"]
@@ -220,22 +335,23 @@ class PaymentEngine:
 
         # --- ADIM 2: Transfer Instruction Kontrolü ---
         # Bu adım, bakiyenin gerçekten bir transferden geldiğini doğrular.
-        valid_amount = 0.0
+        # Miktarlar zincirdeki haliyle (atomik tam sayı) toplanır.
+        valid_atomic = 0
         detected_mint = None
         
-        # Tüm instructionları düzleştir (Inner dahil)
-        all_ixs = message.get("instructions", []) + [
-            ix for inner in meta.get("innerInstructions", []) 
-            for ix in inner.get("instructions", [])
-        ]
+        # Tüm instructionları düzleştir (Inner dahil) — chain ara liste kurmaz
+        all_ixs = itertools.chain(
+            message.get("instructions", ()),
+            *(inner.get("instructions", ()) for inner in meta.get("innerInstructions", ()))
+        )
 
         for ix in all_ixs:
-            if ix.get("program") not in ["spl-token", "spl-token-2022"]: continue
+            if ix.get("program") not in ACCEPTED_PROGRAMS: continue
             parsed = ix.get("parsed")
             if not isinstance(parsed, dict): continue
             
             type_ = parsed.get("type")
-            if type_ not in ["transfer", "transferChecked"]: continue
+            if type_ not in ("transfer", "transferChecked"): continue
             
             info = parsed.get("info", {})
             dest = info.get("destination")
@@ -245,58 +361,64 @@ class PaymentEngine:
             
             current_mint = master_atas_in_tx[dest]
             
-            # Miktar hesapla
-            amt = 0.0
+            # Miktar hesapla (raw amount, decimal bölmesi yok)
             if type_ == "transfer":
-                amt = int(info.get("amount", "0")) / 1_000_000.0
+                valid_atomic += int(info.get("amount", "0"))
             else:
-                amt = float(info.get("tokenAmount", {}).get("uiAmount", 0.0))
-            
-            valid_amount += amt
+                valid_atomic += int(info.get("tokenAmount", {}).get("amount", "0"))
             detected_mint = current_mint
 
-        if valid_amount < MIN_ACCEPT_AMOUNT: return None
+        if valid_atomic < MIN_ACCEPT_ATOMIC: return None
 
         # --- ADIM 3: Ödeyen Kişiyi Bul (Balance Delta Analysis) ---
         # "Kimin cebinden para çıktı?" sorusunun cevabı. En güvenli yöntem.
         payer_address = None
         
+        # Post bakiyeleri bir kez indexle: iç içe tarama (O(M^2)) yerine
+        # her pre kaydı için O(1) lookup
+        post_by_idx = {
+            p["accountIndex"]: float(p["uiTokenAmount"]["uiAmount"] or 0)
+            for p in meta.get("postTokenBalances", [])
+        }
+
+        # İç içe dict erişimlerini tek geçişte düz tuple'lara aç: döngü
+        # gövdesi iterasyon başına hash lookup yerine tuple unpack yapar
+        pre_rows = [
+            (p["mint"], p["owner"], p["accountIndex"],
+             float(p["uiTokenAmount"]["uiAmount"] or 0))
+            for p in meta.get("preTokenBalances", [])
+        ]
+
         # Pre-Balances'da olup bakiyesi azalan kişiyi bul
-        for pre in meta.get("preTokenBalances", []):
-            if pre["mint"] != detected_mint: continue
-            if pre["owner"] == MASTER_WALLET: continue # Kendimiz olamayız
+        for mint_, owner, idx, pre_amt in pre_rows:
+            if mint_ != detected_mint: continue
+            if owner == MASTER_WALLET: continue # Kendimiz olamayız
             
-            # Post balance'ı bul
-            post_amt = 0.0
-            for post in meta.get("postTokenBalances", []):
-                if post["accountIndex"] == pre["accountIndex"]:
-                    post_amt = float(post["uiTokenAmount"]["uiAmount"] or 0)
-                    break
-            
-            pre_amt = float(pre["uiTokenAmount"]["uiAmount"] or 0)
-            delta = pre_amt - post_amt
+            delta = pre_amt - post_by_idx.get(idx, 0.0)
             
             # Eğer eksilen miktar, ödenen miktara yakınsa (tolerans dahil) ödeyen budur.
             if delta >= MIN_ACCEPT_AMOUNT:
-                payer_address = pre["owner"]
+                payer_address = owner
                 break
 
         if not payer_address:
-            logger.warning(f"Valid amount received but Payer not identified in {signature}")
+            logger.warning("Valid amount received but Payer not identified in %s", signature)
             return None
 
         # --- ADIM 4: Oturum Eşleştirme ve Aktivasyon ---
-        currency = "USDT" if "Es9v" in detected_mint else "USDC"
-        logger.info(f"💰 Detected {valid_amount} {currency} from {payer_address}")
+        currency = MINT_TO_CURRENCY.get(detected_mint, "UNKNOWN")
+        # Float'a sadece log satırında inilir
+        logger.info("💰 Detected %s %s from %s",
+                    valid_atomic / 10 ** STABLE_DECIMALS, currency, payer_address)
 
         session = session_manager.get_valid_session(payer_address)
         
         if not session:
-            logger.info(f"No active session for {payer_address}. Ignoring.")
+            logger.info("No active session for %s. Ignoring.", payer_address)
             return None
 
         user_id = session["user_id"]
-        logger.info(f"✅ MATCH! Activating Premium for User {user_id}")
+        logger.info("✅ MATCH! Activating Premium for User %s", user_id)
         
         expiry = self._activate_premium_direct(user_id)
         session_manager.complete_session(payer_address)
@@ -305,9 +427,79 @@ class PaymentEngine:
         return user_id
 
     async def run_forever(self):
-        """Sürekli çalışan ana döngü."""
+        """Sürekli çalışan ana döngü.
+
+        Varsayılan mod push: logsSubscribe ile Master Wallet'ı anan her
+        finalize işlem anında kuyruğa düşer ve doğrulanır. Polling yolu
+        PAYMENT_FORCE_POLLING=1 ile geri açılabilir (fallback).
+        """
         logger.info("🚀 Payment Engine Started. Monitoring Blockchain...")
-        
+
+        try:
+            if FORCE_POLLING:
+                await self._poll_loop()
+            else:
+                await self._subscribe_loop()
+        finally:
+            await self.http_client.aclose()
+
+    async def _subscribe_loop(self):
+        """Helius WSS üzerinden push tabanlı imza akışı."""
+        ws_url = f"wss://mainnet.helius-rpc.com/?api-key={HELIUS_API_KEY}"
+        queue: asyncio.Queue = asyncio.Queue()
+        worker = asyncio.create_task(self._verify_worker(queue))
+
+        try:
+            while True:
+                try:
+                    # Token transferlerinde account keys'te Master Wallet değil
+                    # onun ATA'ları geçer; polling'in ATA'ları izlemesiyle aynı
+                    # sebeple her izlenen adres için ayrı abonelik açılır.
+                    targets = await self._get_monitoring_addresses()
+                    async with websockets.connect(ws_url, ping_interval=20) as ws:
+                        for addr in targets:
+                            await ws.send(orjson.dumps({
+                                "jsonrpc": "2.0",
+                                "id": next(self._next_id),
+                                "method": "logsSubscribe",
+                                "params": [
+                                    {"mentions": [addr]},
+                                    {"commitment": "finalized"}
+                                ]
+                            }).decode())
+                        logger.info("📡 logsSubscribe active for %s addresses", len(targets))
+
+                        async for raw in ws:
+                            msg = orjson.loads(raw)
+                            value = (msg.get("params", {})
+                                        .get("result", {})
+                                        .get("value", {}))
+                            sig = value.get("signature")
+                            # Hatalı işlemler push tarafında da elenir
+                            if sig and value.get("err") is None:
+                                queue.put_nowait(sig)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error("WebSocket dropped, reconnecting: %s", e)
+                    await asyncio.sleep(5)
+        finally:
+            worker.cancel()
+
+    async def _verify_worker(self, queue: asyncio.Queue):
+        """Kuyruktan imza tüketir; doğrulama WS okumayı bloklamaz."""
+        while True:
+            sig = await queue.get()
+            try:
+                if not self._is_processed(sig):
+                    await self.verify_transaction(sig)
+                    self._mark_processed(sig)
+            except Exception as e:
+                logger.error("Verify Worker Error (%s): %s", sig, e)
+            finally:
+                queue.task_done()
+
+    async def _poll_loop(self):
         while True:
             try:
                 # 1. Dinlenecek adresleri güncelle (ATA'lar değişebilir)
@@ -315,31 +507,41 @@ class PaymentEngine:
                 
                 unique_signatures = set()
 
-                # 2. Her adres için son işlemleri çek
-                for address in targets:
-                    resp = await self._rpc_call("getSignaturesForAddress", [
-                        address, 
+                # 2. Her adres için son işlemleri paralel çek; hız sınırı
+                # artık _rpc_call içindeki token-bucket tarafından uygulanır
+                sig_responses = await asyncio.gather(
+                    *(self._rpc_call("getSignaturesForAddress", [
+                        a,
                         {"limit": 10, "commitment": "finalized"}
-                    ])
-                    
+                    ]) for a in targets)
+                )
+                for resp in sig_responses:
                     if "result" in resp:
                         for item in resp["result"]:
+                            # Hatalı veya henüz finalize olmamış imzalar için
+                            # koca getTransaction gövdesini hiç çekme
+                            if item.get("err") is not None:
+                                continue
+                            if item.get("confirmationStatus") != "finalized":
+                                continue
                             unique_signatures.add(item["signature"])
-                    
-                    # Rate limit koruması
-                    await asyncio.sleep(0.5)
-
-                # 3. İşlemleri Analiz Et
-                for sig in unique_signatures:
-                    if self._is_processed(sig): continue
-                    
-                    await self.verify_transaction(sig)
+
+                # 3. İşlemleri Analiz Et (N ayrı çağrı yerine tek batch POST)
+                new_sigs = [s for s in unique_signatures if not self._is_processed(s)]
+                tx_opts = {
+                    "encoding": "jsonParsed",
+                    "maxSupportedTransactionVersion": 0,
+                    "commitment": "finalized"
+                }
+                responses = await self._rpc_batch(
+                    [("getTransaction", [sig, tx_opts]) for sig in new_sigs]
+                )
+                for sig, resp in zip(new_sigs, responses):
+                    await self.verify_transaction(sig, resp)
                     self._mark_processed(sig)
-                    
-                    await asyncio.sleep(0.5)
 
             except Exception as e:
-                logger.error(f"Polling Loop Error: {e}")
+                logger.error("Polling Loop Error: %s", e)
             
             # 30 saniye bekle
             await asyncio.sleep(30)
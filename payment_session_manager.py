@@ -1,7 +1,9 @@
-import json
 import os
+import threading
 import time
 import logging
+
+import orjson
 from contextlib import contextmanager
 from typing import Dict, Any, Optional
 
@@ -9,7 +11,6 @@ from typing import Dict, Any, Optional
 SESSIONS_FILE = "payment_sessions.json"
 USED_WALLETS_FILE = "used_wallets.json"
 SESSION_TIMEOUT = 1800  # 30 Dakika (Saniye cinsinden)
-LOCK_FILE = "session.lock"
 
 # --- LOGGING ---
 logging.basicConfig(
@@ -20,7 +21,12 @@ logger = logging.getLogger("SessionManager")
 
 class PaymentSessionManager:
     def __init__(self):
-        """Başlangıçta gerekli dosyaların varlığını kontrol eder."""
+        """Durumu diskten BİR KEZ yükler; sonrası bellekten servis edilir."""
+        self._mutex = threading.RLock()
+        # Bellek içi asıl kopya: her çağrıda JSON parse etmek yerine
+        # mutasyonlar önce burada yapılır, ardından diske yazılır.
+        self._sessions: Dict[str, Dict] = self._load(SESSIONS_FILE)
+        self._used: set = set(self._load(USED_WALLETS_FILE))
         if not os.path.exists(SESSIONS_FILE):
             self._save(SESSIONS_FILE, {})
         if not os.path.exists(USED_WALLETS_FILE):
@@ -29,73 +35,42 @@ class PaymentSessionManager:
     @contextmanager
     def _lock(self):
         """
-        Basit dosya tabanlı Spinlock.
-        Aynı anda birden fazla işlemin JSON dosyasına yazmasını engeller.
+        Süreç içi mutex. Tüm çağıranlar aynı singleton üzerinden geldiği
+        için dosya tabanlı spinlock gereksizdi: RLock edinimi nanosaniye
+        mertebesinde ve bayat kilit dosyası riski yok.
         """
-        timeout = 5.0
-        start_time = time.time()
-        
-        while os.path.exists(LOCK_FILE):
-            # Deadlock koruması: Kilit dosyası çok eskiyse (örn. crash durumunda) sil
-            if time.time() - os.path.getmtime(LOCK_FILE) > 5:
-                try:
-                    os.remove(LOCK_FILE)
-                    logger.warning("Stale lock file removed.")
-                except OSError:
-                    pass
-            
-            if time.time() - start_time > timeout:
-                logger.error("Lock timeout reached!")
-                break
-                
-            time.sleep(0.1)
-
-        # Kilidi al
-        try:
-            with open(LOCK_FILE, 'w') as f:
-                f.write("1")
+        with self._mutex:
             yield
-        finally:
-            # Kilidi bırak
-            if os.path.exists(LOCK_FILE):
-                try:
-                    os.remove(LOCK_FILE)
-                except OSError:
-                    pass
 
     def _load(self, fname: str) -> Any:
-        """Güvenli JSON okuma."""
+        """Güvenli JSON okuma (orjson: C hızında parse)."""
         try:
-            with open(fname, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(fname, 'rb') as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
             return {} if fname == SESSIONS_FILE else []
 
     def _save(self, fname: str, data: Any):
         """Atomik yazma işlemi (Temp file -> Rename)."""
         tmp = f"{fname}.tmp"
         try:
-            with open(tmp, 'w') as f:
-                json.dump(data, f, indent=4)
+            with open(tmp, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE))
             os.replace(tmp, fname)
         except OSError as e:
-            logger.error(f"Failed to save {fname}: {e}")
+            logger.error("Failed to save %s: %s", fname, e)
 
     def is_wallet_used(self, wallet: str) -> bool:
-        """Bu cüzdan daha önce premium almış mı?"""
+        """Bu cüzdan daha önce premium almış mı? (O(1) set lookup)"""
         # Okuma işlemi için kilide gerek yok (performans için)
-        # Ancak çok yüksek trafikli sistemlerde okuma kilidi de düşünülebilir.
-        used_wallets = self._load(USED_WALLETS_FILE)
-        return wallet in used_wallets
+        return wallet in self._used
 
     def create_session(self, user_id: int, wallet: str) -> Dict:
         """Yeni bir ödeme oturumu başlatır."""
         with self._lock():
-            sessions = self._load(SESSIONS_FILE)
-            
             # Eski oturumları temizle (Aynı kullanıcı veya aynı cüzdan)
             clean_sessions = {
-                k: v for k, v in sessions.items() 
+                k: v for k, v in self._sessions.items() 
                 if v["user_id"] != user_id and k != wallet
             }
             
@@ -110,7 +85,8 @@ class PaymentSessionManager:
             
             # Cüzdan adresi anahtar olarak kullanılır (Hızlı erişim için)
             clean_sessions[wallet] = session
-            self._save(SESSIONS_FILE, clean_sessions)
+            self._sessions = clean_sessions
+            self._save(SESSIONS_FILE, self._sessions)
             
             return session
 
@@ -120,16 +96,15 @@ class PaymentSessionManager:
         Süresi dolmuşsa siler.
         """
         with self._lock():
-            sessions = self._load(SESSIONS_FILE)
-            session = sessions.get(wallet)
+            session = self._sessions.get(wallet)
             
             if not session:
                 return None
             
             # Süre kontrolü
             if int(time.time()) > session["expires_at"]:
-                del sessions[wallet]
-                self._save(SESSIONS_FILE, sessions)
+                del self._sessions[wallet]
+                self._save(SESSIONS_FILE, self._sessions)
                 return None
             
             return session
@@ -141,16 +116,14 @@ class PaymentSessionManager:
         """
         with self._lock():
             # 1. Oturumu Sil
-            sessions = self._load(SESSIONS_FILE)
-            if wallet in sessions:
-                del sessions[wallet]
-                self._save(SESSIONS_FILE, sessions)
+            if wallet in self._sessions:
+                del self._sessions[wallet]
+                self._save(SESSIONS_FILE, self._sessions)
             
             # 2. Cüzdanı Kara Listeye Al (Reuse Prevention)
-            used = self._load(USED_WALLETS_FILE)
-            if wallet not in used:
-                used.append(wallet)
-                self._save(USED_WALLETS_FILE, used)
+            if wallet not in self._used:
+                self._used.add(wallet)
+                self._save(USED_WALLETS_FILE, sorted(self._used))
 
 # Singleton Instance
 session_manager = PaymentSessionManager()
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""Ortak JSON katmanı: orjson > ujson > stdlib json sırasıyla denenir.
+
+orjson (Rust) kurulamayan ortamlarda ujson (C) hala stdlib'e göre ~3x
+kazandırır; ikisi de yoksa stdlib json ile aynı arayüz korunur.
+dumps her zaman bytes döner, loads bytes/str kabul eder.
+"""
+
+try:
+    import orjson as _backend
+
+    JSONDecodeError = _backend.JSONDecodeError
+
+    def dumps(obj, pretty: bool = False) -> bytes:
+        option = _backend.OPT_NON_STR_KEYS
+        if pretty:
+            option |= _backend.OPT_INDENT_2
+        return _backend.dumps(obj, option=option)
+
+    loads = _backend.loads
+
+except ImportError:
+    try:
+        import ujson as _backend
+    except ImportError:
+        import json as _backend
+
+    JSONDecodeError = ValueError  # ujson ve stdlib decode hataları ValueError türevi
+
+    def dumps(obj, pretty: bool = False) -> bytes:
+        if pretty:
+            return _backend.dumps(obj, indent=2).encode()
+        return _backend.dumps(obj).encode()
+
+    loads = _backend.loads
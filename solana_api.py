@@ -1,4 +1,5 @@
 import os
+import itertools
 import logging
 import asyncio
 import time
@@ -11,15 +12,19 @@ from typing import Dict, Any
 # --- MODULE IMPORTS ---
 # Bu dosyaların aynı klasörde olduğundan emin ol
 from token_analyzer import calculate_supply_score
-from whale_engine import calculate_whale_pressure
+from whale_engine import whale_engine, calculate_whale_pressure
 from dominance_tracker import calculate_dominance_shift
 from behavior_verdict import generate_behavior_verdict
+from http_clients import dex_client, aclose_all
 
 # --- CONFIGURATION ---
 API_KEY = os.getenv("HELIUS_API_KEY")
 RPC_URL = f"https://mainnet.helius-rpc.com/?api-key={API_KEY}"
 MAX_RPC_RETRIES = 3
 
+# RPC id üretici: time() tabanlı id aynı milisaniyede çakışabilir
+_next_rpc_id = itertools.count(1)
+
 # --- LOGGING ---
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
@@ -38,6 +43,8 @@ async def lifespan(app: FastAPI):
     yield
     logger.info("🛑 API Shutting Down...")
     await app.state.client.aclose()
+    await whale_engine.aclose()
+    await aclose_all()
 
 app = FastAPI(title="TheRugScopeBot API", version="2.6", lifespan=lifespan)
 
@@ -48,8 +55,8 @@ async def fetch_price_data(client: httpx.AsyncClient, mint: str) -> Dict:
     DexScreener API üzerinden anlık fiyat verisi çeker.
     """
     try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{mint}"
-        resp = await client.get(url)
+        # DexScreener kendi havuzundan gider; RPC client'ını meşgul etmez
+        resp = await dex_client.get(f"/latest/dex/tokens/{mint}")
         
         if resp.status_code == 200:
             data = resp.json()
@@ -66,7 +73,7 @@ async def fetch_price_data(client: httpx.AsyncClient, mint: str) -> Dict:
                     "liquidity_usd": float(best_pair.get("liquidity", {}).get("usd", 0))
                 }
     except Exception as e:
-        logger.error(f"DexScreener Error: {e}")
+        logger.error("DexScreener Error: %s", e)
     
     # Hata durumunda veya veri yoksa boş dön
     return {"found": False, "price_usd": 0.0, "price_change_1h": 0.0}
@@ -77,7 +84,7 @@ async def fetch_rpc(client: httpx.AsyncClient, method: str, params: list) -> Dic
         try:
             payload = {
                 "jsonrpc": "2.0", 
-                "id": int(time.time()*1000), 
+                "id": next(_next_rpc_id), 
                 "method": method, 
                 "params": params
             }
@@ -97,11 +104,24 @@ async def fetch_rpc(client: httpx.AsyncClient, method: str, params: list) -> Dic
         except Exception as e:
             wait_time = 0.5 * (2 ** attempt)
             if attempt == MAX_RPC_RETRIES - 1:
-                logger.error(f"RPC Failed: {e}")
+                logger.error("RPC Failed: %s", e)
                 return {} 
             await asyncio.sleep(wait_time)
     return {}
 
+async def _reap_task(task: asyncio.Task) -> None:
+    """Görevi iptal eder ve sonucunu tüketir.
+
+    Hata yollarında yarıda kalan görev hem RPC turlarını boşa harcar hem
+    "Task exception was never retrieved" gürültüsü üretir; iptal + await
+    ikisini de kapatır.
+    """
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
 def parse_token_amount(info: dict, decimals: int) -> float:
     """
     Hem uiAmount hem de raw amount desteği (%0 hatasını çözen kısım).
@@ -123,10 +143,14 @@ async def analyze_token(mint: str):
     client: httpx.AsyncClient = app.state.client
     start_time = time.time()
 
-    try:
-        logger.info(f"🔍 Analyzing: {mint}")
+    logger.info("🔍 Analyzing: %s", mint)
 
-        # --- ADIM 1: PARALEL VERİ TOPLAMA ---
+    # --- ADIM 1: PARALEL VERİ TOPLAMA ---
+    # Balina motoru RPC sonuçlarına ihtiyaç duymaz; kendi ağ turlarını
+    # aşağıdaki gather ile çakıştırmak için en başta başlatılır.
+    whale_task = asyncio.create_task(calculate_whale_pressure(mint))
+
+    try:
         # Fiyat, Güvenlik, Arz ve Holderlar aynı anda çekilir
         price_task = fetch_price_data(client, mint)
         security_task = fetch_rpc(client, "getAccountInfo", [mint, {"encoding": "jsonParsed"}])
@@ -157,8 +181,13 @@ async def analyze_token(mint: str):
         if not accounts:
             raise HTTPException(status_code=404, detail="No Holder Data Found")
 
-        top1_amount = parse_token_amount(accounts[0], decimals)
-        top10_amount = sum(parse_token_amount(a, decimals) for a in accounts[:10])
+        # getTokenLargestAccounts şeması sabittir: "amount" her zaman var
+        # ve decimal string'dir; ölçek bir kez hesaplanıp tam sayı toplamı
+        # tek bölmeyle yüzdeye çevrilir
+        scale = 10 ** decimals
+        amounts = [int(a["amount"]) for a in accounts[:10]]
+        top1_amount = amounts[0] / scale
+        top10_amount = sum(amounts) / scale
         
         top1_percent = min(100.0, (top1_amount / total_supply) * 100)
         top10_percent = min(100.0, (top10_amount / total_supply) * 100)
@@ -172,8 +201,8 @@ async def analyze_token(mint: str):
             total_holders=len(accounts)
         )
         
-        # B. Balina & Bundle Motoru
-        whale_data = await calculate_whale_pressure(mint)
+        # B. Balina & Bundle Motoru (Adım 1'de başlatıldı, burada toplanır)
+        whale_data = await whale_task
         
         # C. Dominance
         dominance_data = calculate_dominance_shift(mint, top1_percent)
@@ -207,9 +236,12 @@ async def analyze_token(mint: str):
         }
 
     except HTTPException:
+        # whale_task her hata yolunda toplanır, sadece 404'te değil
+        await _reap_task(whale_task)
         raise
     except Exception as e:
-        logger.error(f"Analysis Failed: {e}", exc_info=True)
+        await _reap_task(whale_task)
+        logger.error("Analysis Failed: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
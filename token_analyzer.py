@@ -2,8 +2,55 @@ import math
 import logging
 from typing import Dict, Any
 
+import numpy as np
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    # Numba opsiyonel: kurulamayan ortamlarda NumPy yolu kullanılır
+    _HAS_NUMBA = False
+
 logger = logging.getLogger("TokenAnalyzer")
 
+def _supply_score_kernel(top1: np.ndarray, top10: np.ndarray, holders: np.ndarray) -> np.ndarray:
+    """Arz skorunu toplu hesaplar (dalsız boolean aritmetiği).
+
+    Eşik merdivenleri kümülatif ceza toplamı olarak yazıldı: her karşılaştırma
+    tüm dizi üzerinde vektörize çalışır, skaler yol ile birebir aynı sonucu
+    verir. Tek tek mint analizinde skaler calculate_supply_score yeterli;
+    bu kernel top-N taramalarında toplu ön eleme içindir.
+    """
+    score = np.full(top1.shape, 100.0)
+    # Top 1 cezaları: >5:-10, >10:-20, >20:-40, >40:-60 (kümülatif farklar)
+    score -= 10.0 * (top1 > 5) + 10.0 * (top1 > 10) + 20.0 * (top1 > 20) + 20.0 * (top1 > 40)
+    # Top 10 cezaları: >=20:-20, >35:-30, >50:-40, >60:-50
+    score -= 20.0 * (top10 >= 20) + 10.0 * (top10 > 35) + 10.0 * (top10 > 50) + 10.0 * (top10 > 60)
+    # Holder düzeltmesi (0 = veri yok, dokunma)
+    known = holders > 0
+    score -= 20.0 * (known & (holders < 100))
+    score -= 10.0 * (known & (holders >= 100) & (holders < 500))
+    score += 5.0 * (holders > 2000)
+    return np.minimum(100.0, np.maximum(0.0, score))
+
+if _HAS_NUMBA:
+    _supply_score_kernel = njit(cache=True, fastmath=True)(_supply_score_kernel)
+    # JIT ısındırma: ilk toplu tarama derleme maliyeti ödemesin
+    _w = np.array([1.0])
+    _supply_score_kernel(_w, _w, _w)
+
+def calculate_supply_scores_batch(
+    top1_percents: np.ndarray,
+    top10_percents: np.ndarray,
+    total_holders: np.ndarray,
+) -> np.ndarray:
+    """N mint için arz skorlarını tek geçişte döner (toplu ön eleme)."""
+    return _supply_score_kernel(
+        np.asarray(top1_percents, dtype=np.float64),
+        np.asarray(top10_percents, dtype=np.float64),
+        np.asarray(total_holders, dtype=np.float64),
+    )
+
 def calculate_supply_score(
     largest_wallet_percent: float, 
     top10_percent: float,
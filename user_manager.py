@@ -1,29 +1,55 @@
-import json
+import atexit
+import mmap
 import os
+import struct
+import threading
 import time
 import logging
 from typing import Dict, Any, List
 
+from serialization import dumps as json_dumps, loads as json_loads, JSONDecodeError
+
 # --- CONFIGURATION ---
-USAGE_FILE = "usage_data.json"
+LEGACY_USAGE_FILE = "usage_data.json"
+LEGACY_USAGE_LOG_FILE = "usage.log"
+USAGE_BIN_FILE = "usage_data.bin"
 PREMIUM_FILE = "premium_users.json"
 DAILY_LIMIT = 5
 RESET_PERIOD = 86400  # 24 Saat
 
+# Sabit boyutlu kayıt: uid (u64) + count (u32) + last_reset (u32) = 16 bayt.
+# Artış tek struct.pack_into ile yerinde yapılır; serialize/rename yok.
+_USAGE_REC = struct.Struct("<QII")
+
 # --- LOGGING ---
 logger = logging.getLogger("UserManager")
 
 class UserManager:
     def __init__(self):
         self._ensure_files()
-        # In-Memory Cache (Performans için)
-        self.usage_cache = self._load_json(USAGE_FILE)
-        self.premium_cache = self._load_json(PREMIUM_FILE)
+        # In-Memory Cache (Performans için). Anahtarlar bellekte int tutulur:
+        # her çağrıda str(user_id) allocation'ı yapılmaz; JSON'a inerken
+        # anahtarlar zaten string'e çevrilir.
+        self.premium_cache: Dict[int, Dict[str, Any]] = {
+            int(k): v for k, v in self._load_json(PREMIUM_FILE).items()
+        }
+        # Usage: mmap'li sabit kayıtlı binary store
+        self.usage_cache: Dict[int, Dict[str, int]] = {}
+        self._index: Dict[int, int] = {}  # uid -> dosya offset'i
+        # Yazarlar için kısa kilit. Premium okumaları kilitsizdir:
+        # premium_cache hiç yerinde değiştirilmez, yazarlar kopya kurup
+        # referansı atomik takas eder (GIL altında referans ataması atomik).
+        # Usage tarafı increment-ağırlıklı olduğundan kopyala-takas O(N)
+        # olurdu; mutasyonları kısa kilit altında yerinde kalır.
+        self._write_lock = threading.Lock()
+        # Admin listesi cache'i: aynı liste nesnesi için frozenset tekrar kurulmaz
+        self._admin_set: frozenset = frozenset()
+        self._admin_ids_id: int = 0
+        self._open_usage_store()
+        atexit.register(self._close_usage_store)
 
     def _ensure_files(self):
         """Dosyalar yoksa oluşturur."""
-        if not os.path.exists(USAGE_FILE):
-            self._atomic_write(USAGE_FILE, {})
         if not os.path.exists(PREMIUM_FILE):
             self._atomic_write(PREMIUM_FILE, {})
 
@@ -31,37 +57,122 @@ class UserManager:
         """Veri kaybını önleyen güvenli yazma işlemi."""
         temp_file = f"{filename}.tmp"
         try:
-            with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=4)
+            with open(temp_file, 'wb') as f:
+                f.write(json_dumps(data, pretty=True))
             os.replace(temp_file, filename)
         except OSError as e:
-            logger.error(f"Failed to save {filename}: {e}")
+            logger.error("Failed to save %s: %s", filename, e)
 
     def _load_json(self, filename: str) -> Dict:
         """JSON dosyasını güvenli okur."""
         try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(filename, 'rb') as f:
+                return json_loads(f.read())
+        except (FileNotFoundError, JSONDecodeError):
             return {}
 
-    def _sync_usage(self):
-        """Usage verilerini diske yazar."""
-        self._atomic_write(USAGE_FILE, self.usage_cache)
+    def _migrate_legacy_usage(self) -> Dict[str, Dict[str, int]]:
+        """Eski JSON snapshot + JSONL log'u bir kez okuyup cache döner."""
+        cache = self._load_json(LEGACY_USAGE_FILE)
+        try:
+            with open(LEGACY_USAGE_LOG_FILE, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rec = json_loads(line)
+                        cache[rec["uid"]] = {
+                            "count": rec["count"],
+                            "last_reset": rec["last_reset"]
+                        }
+                    except (JSONDecodeError, KeyError):
+                        continue  # Yarım satır (crash artığı) yoksayılır
+        except FileNotFoundError:
+            pass
+        return cache
+
+    def _open_usage_store(self):
+        """Binary store'u açar; yoksa eski JSON verisinden bir kez kurar."""
+        if not os.path.exists(USAGE_BIN_FILE):
+            cache = self._migrate_legacy_usage()
+            with open(f"{USAGE_BIN_FILE}.tmp", 'wb') as f:
+                for uid, rec in cache.items():
+                    f.write(_USAGE_REC.pack(int(uid), rec["count"], rec["last_reset"]))
+            os.replace(f"{USAGE_BIN_FILE}.tmp", USAGE_BIN_FILE)
+            for legacy in (LEGACY_USAGE_FILE, LEGACY_USAGE_LOG_FILE):
+                if os.path.exists(legacy):
+                    os.replace(legacy, f"{legacy}.bak")
+
+        self._usage_fd = os.open(USAGE_BIN_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._usage_fd).st_size
+        # mmap sıfır uzunlukta dosyayı eşleyemez; ilk kaydı resize ekler
+        self._mm = mmap.mmap(self._usage_fd, size) if size else None
+
+        if self._mm is not None:
+            n = size // _USAGE_REC.size
+            for i in range(n):
+                off = i * _USAGE_REC.size
+                uid, count, last_reset = _USAGE_REC.unpack_from(self._mm, off)
+                self.usage_cache[uid] = {"count": count, "last_reset": last_reset}
+                self._index[uid] = off
+
+    def _close_usage_store(self):
+        try:
+            if self._mm is not None:
+                self._mm.flush()
+                self._mm.close()
+            os.close(self._usage_fd)
+        except (OSError, ValueError):
+            pass
+
+    def _sync_usage(self, uid: int):
+        """Kullanıcının kaydını mmap üzerinde yerinde günceller (O(1)).
+
+        Artış tek pack_into'dur: serialize yok, rename yok; baytlar page
+        cache üzerinden diske iner. Yeni kullanıcı dosyayı bir kayıt
+        büyütüp sona eklenir.
+        """
+        rec = self.usage_cache[uid]
+        off = self._index.get(uid)
+        try:
+            if off is None:
+                off = self._mm.size() if self._mm is not None else 0
+                if self._mm is not None:
+                    self._mm.resize(off + _USAGE_REC.size)
+                else:
+                    os.ftruncate(self._usage_fd, _USAGE_REC.size)
+                    self._mm = mmap.mmap(self._usage_fd, _USAGE_REC.size)
+                self._index[uid] = off
+            _USAGE_REC.pack_into(self._mm, off, uid, rec["count"], rec["last_reset"])
+        except (OSError, ValueError) as e:
+            logger.error("Usage store write failed (%s): %s", uid, e)
 
     def _sync_premium(self):
         """Premium verilerini diske yazar."""
         self._atomic_write(PREMIUM_FILE, self.premium_cache)
 
+    def _admin_frozen(self, admin_ids: List[int]) -> frozenset:
+        """Gelen admin listesini frozenset olarak cache'ler.
+
+        Çağıranlar hep aynı modül seviyesi listeyi geçirir; id() değişmediği
+        sürece set bir kez kurulur ve üyelik testi O(1) olur.
+        """
+        if id(admin_ids) != self._admin_ids_id:
+            self._admin_set = frozenset(admin_ids)
+            self._admin_ids_id = id(admin_ids)
+        return self._admin_set
+
     def check_status(self, user_id: int, admin_ids: List[int]) -> Dict[str, Any]:
         """
         Kullanıcının yetkisini ve limitlerini kontrol eder.
         Öncelik: Admin > Premium > Free
         """
-        uid = str(user_id)
-        
-        # 1. ADMIN CHECK
-        if user_id in admin_ids:
+        # Saat tek sefer okunur; metodun geri kalanı bu değeri kullanır
+        now = time.time()
+        now_i = int(now)
+
+        # 1. ADMIN CHECK (O(1) set üyeliği)
+        if user_id in self._admin_frozen(admin_ids):
             return {
                 "allowed": True, 
                 "type": "Admin", 
@@ -69,12 +180,13 @@ class UserManager:
                 "limit": "Unlimited"
             }
 
-        # 2. PREMIUM CHECK (Cache üzerinden)
-        if uid in self.premium_cache:
-            user_prem = self.premium_cache[uid]
+        # 2. PREMIUM CHECK (Kilitsiz okuma: yerel snapshot referansı)
+        prem_snapshot = self.premium_cache
+        user_prem = prem_snapshot.get(user_id)
+        if user_prem is not None:
             if user_prem.get("active", False):
                 expires_at = user_prem.get("expires_at", 0)
-                if expires_at > time.time():
+                if expires_at > now:
                     return {
                         "allowed": True, 
                         "type": "Premium", 
@@ -82,23 +194,28 @@ class UserManager:
                         "limit": "Unlimited"
                     }
                 else:
-                    # Süresi dolmuş, pasife çek ve diske yaz
-                    user_prem["active"] = False
+                    # Süresi dolmuş: kopyala-değiştir-takas, sonra diske yaz
+                    with self._write_lock:
+                        new_prem = dict(self.premium_cache)
+                        entry = dict(new_prem.get(user_id, user_prem))
+                        entry["active"] = False
+                        new_prem[user_id] = entry
+                        self.premium_cache = new_prem
                     self._sync_premium()
 
-        # 3. FREE CHECK (Cache üzerinden)
-        if uid not in self.usage_cache:
-            self.usage_cache[uid] = {"count": 0, "last_reset": int(time.time())}
-            # Yeni kullanıcı olduğu için diske yazmaya gerek yok, increment'te yazılır.
-        
-        user_usage = self.usage_cache[uid]
-        current_time = int(time.time())
-        
-        # Günlük Limit Sıfırlama Kontrolü
-        if current_time - user_usage["last_reset"] >= RESET_PERIOD:
-            user_usage["count"] = 0
-            user_usage["last_reset"] = current_time
-            self._sync_usage() # Resetlendiği için diske yaz
+        # 3. FREE CHECK (Mutasyon ihtimali olduğu için kısa kilit)
+        with self._write_lock:
+            user_usage = self.usage_cache.get(user_id)
+            if user_usage is None:
+                # Yeni kullanıcı olduğu için diske yazmaya gerek yok, increment'te yazılır.
+                user_usage = {"count": 0, "last_reset": now_i}
+                self.usage_cache[user_id] = user_usage
+            
+            # Günlük Limit Sıfırlama Kontrolü
+            if now_i - user_usage["last_reset"] >= RESET_PERIOD:
+                user_usage["count"] = 0
+                user_usage["last_reset"] = now_i
+                self._sync_usage(user_id) # Resetlendiği için diske yaz
 
         count = user_usage["count"]
         
@@ -123,46 +240,55 @@ class UserManager:
         """
         Kullanım sayacını artırır. Sadece Free kullanıcılar için çalışır.
         """
-        if user_id in admin_ids:
+        if user_id in self._admin_frozen(admin_ids):
             return
 
-        uid = str(user_id)
-        
-        # Premium kullanıcı ise artırma
-        if uid in self.premium_cache:
-            p = self.premium_cache[uid]
-            if p.get("active") and p.get("expires_at") > time.time():
-                return
-
-        # Free kullanıcı sayacını artır
-        if uid not in self.usage_cache:
-            self.usage_cache[uid] = {"count": 0, "last_reset": int(time.time())}
-        
-        self.usage_cache[uid]["count"] += 1
-        
-        # Kritik veriyi diske yaz (Crash durumunda kaybolmasın)
-        self._sync_usage()
+        now = time.time()
+
+        # Premium kullanıcı ise artırma (tek lookup)
+        p = self.premium_cache.get(user_id)
+        if p is not None and p.get("active") and p.get("expires_at") > now:
+            return
+
+        # Free kullanıcı sayacını artır (tek lookup, kısa kilit)
+        with self._write_lock:
+            user_usage = self.usage_cache.get(user_id)
+            if user_usage is None:
+                user_usage = {"count": 0, "last_reset": int(now)}
+                self.usage_cache[user_id] = user_usage
+            
+            user_usage["count"] += 1
+            
+            # Kritik veriyi diske yaz (Crash durumunda kaybolmasın)
+            self._sync_usage(user_id)
 
     # --- ADMIN FEATURES (EKLENDİ) ---
 
     def set_premium(self, user_id: int, days: int) -> str:
         """Bir kullanıcıya X günlüğüne Premium verir (Admin için)."""
-        uid = str(user_id)
-        expires_at = int(time.time()) + (days * 86400)
+        now_i = int(time.time())
+        expires_at = now_i + (days * 86400)
         
-        self.premium_cache[uid] = {
-            "active": True,
-            "expires_at": expires_at,
-            "updated_at": int(time.time())
-        }
+        with self._write_lock:
+            new_prem = dict(self.premium_cache)
+            new_prem[user_id] = {
+                "active": True,
+                "expires_at": expires_at,
+                "updated_at": now_i
+            }
+            self.premium_cache = new_prem
         self._sync_premium()
         return time.strftime('%Y-%m-%d', time.localtime(expires_at))
 
     def remove_premium(self, user_id: int):
         """Bir kullanıcının Premium yetkisini alır."""
-        uid = str(user_id)
-        if uid in self.premium_cache:
-            self.premium_cache[uid]["active"] = False
+        if user_id in self.premium_cache:
+            with self._write_lock:
+                new_prem = dict(self.premium_cache)
+                entry = dict(new_prem[user_id])
+                entry["active"] = False
+                new_prem[user_id] = entry
+                self.premium_cache = new_prem
             self._sync_premium()
 
 # Singleton Instance
@@ -1,11 +1,18 @@
 import os
 import asyncio
+import bisect
+import itertools
+import math
+import operator
+import random
 import logging
 import httpx
 import time
 from collections import Counter
 from typing import Dict, List, Optional
 
+from serialization import dumps as json_dumps, loads as json_loads, JSONDecodeError
+
 # --- LOGGING ---
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
@@ -13,38 +20,161 @@ logging.basicConfig(
 )
 logger = logging.getLogger("WhaleEngine")
 
+# RPC id üretici: time() tabanlı id aynı milisaniyede çakışabilir
+_next_rpc_id = itertools.count(1)
+
 # --- CONFIG ---
 API_KEY = os.getenv("HELIUS_API_KEY")
 RPC_URL = f"https://mainnet.helius-rpc.com/?api-key={API_KEY}"
 MAX_RETRIES = 3
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Sıcak döngü için önceden bağlanmış alan erişimcileri: her iterasyonda
+# metod çözümleme yerine tek C-seviyesi çağrı
+_get_owner = operator.itemgetter("owner")
+_get_mint = operator.itemgetter("mint")
+_get_amt = operator.itemgetter("uiTokenAmount")
+
+# Bilinen borsa sıcak cüzdanları: bunlar için funding analizi anlamsız,
+# RPC'ye hiç çıkılmadan "Established_User" döner
+KNOWN_CEX = frozenset({
+    "5tzFkiKscXHK5ZXCGbXZxdw7gTjjD1mBwuoFbhUvuAi9",  # Binance
+    "2ojv9BAiHUrvsm9gxDe7fJSzbNZSJcxZvf8dqmWGHG8S",  # Binance 2
+    "H8sMJSCQxfKiFTCfDR3DUMLPwcRbM61LGFJ8N4dK3WjS",  # Coinbase
+    "FWznbcNXWQuHTawe9RxvQ2LdCENssh12dsznf4RiouN5",  # Kraken
+})
+
+# Baskı sınıflandırması: eşikler fonksiyon gövdesi yerine burada durur,
+# bisect ile tek aramada etikete gidilir. Üst sınır bir ULP kaydırılır ki
+# tam -0.5 ve +0.5 değerleri (eski strict karşılaştırmalardaki gibi)
+# Neutral kalsın: bisect_right alt sınırı, kaydırılmış üst sınır üstünü çözer.
+_PRESSURE_BOUNDS = [-0.5, math.nextafter(0.5, 1.0)]
+_PRESSURE_LABELS = ["Strong Distribution", "Neutral", "Strong Accumulation"]
 CONCURRENCY_LIMIT = 5  # Paralel işlem limiti
+# Arzın bu yüzdesinden az tutan holder için funding analizi atlanır:
+# toz cüzdanlar bundle sinyali üretmez, 2 RPC turu boşa gider
+MIN_FUND_SHARE_PCT = 0.1
+# Funding kaynağı pratikte değişmez; cevap bu süre cache'lenir (saniye).
+# None hem "belirlenemedi" hem RPC hatası olabilir: kısa TTL ile tutulur ki
+# geçici bir Helius hatası holder'ı bir saat bundle analizinden düşürmesin.
+FUNDER_CACHE_TTL = 3600.0
+FUNDER_NONE_TTL = 60.0
+
+def _extract_net_change(raw: bytes, ids: List[int], wallet: str, mint: str) -> float:
+    """Batch cevabından cüzdanın net token değişimini çıkarır (saf CPU)."""
+    results = json_loads(raw)
+    by_id = {r.get("id"): r for r in results if isinstance(r, dict)}
+
+    net_change = 0.0
+    for i in ids:
+        result = by_id.get(i, {}).get("result")
+        if not result or result.get("meta", {}).get("err"): continue
+
+        meta = result["meta"]
+        # Tek tuple karşılaştırması: owner+mint ayrı ayrı kıyaslanmaz
+        target = (wallet, mint)
+        pre = 0.0
+        for b in meta.get("preTokenBalances", ()):
+            if (_get_owner(b), _get_mint(b)) == target:
+                pre = float(_get_amt(b)["uiAmount"] or 0)
+                break
+        post = 0.0
+        for b in meta.get("postTokenBalances", ()):
+            if (_get_owner(b), _get_mint(b)) == target:
+                post = float(_get_amt(b)["uiAmount"] or 0)
+                break
+
+        net_change += (post - pre)
+
+    return net_change
 
 class WhaleEngine:
     def __init__(self):
         self.semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+        # Aynı balina cüzdanları farklı tokenlarda tekrar tekrar çıkar;
+        # funding cevabı TTL ile saklanır: cüzdan -> (zaman, sonuç)
+        self._funder_cache: Dict[str, tuple] = {}
+        # "Yerleşik" kararı kalıcıdır: 100+ işlemli cüzdan geri "fresh" olmaz
+        self._established_cache: set = set()
+        # Kalıcı client: TLS/DNS maliyeti ilk istekte bir kez ödenir,
+        # HTTP/2 tek bağlantı üzerinde istekleri multiplex eder
+        self.client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+
+    async def aclose(self):
+        """Paylaşılan client'ı kapatır (uygulama kapanışı için)."""
+        await self.client.aclose()
 
     async def _rpc_call(self, client: httpx.AsyncClient, method: str, params: list) -> Dict:
-        """Güvenli RPC Çağrısı"""
+        """Güvenli RPC Çağrısı.
+
+        Sadece geçici hatalar (timeout, 5xx, 429) yeniden denenir; diğer
+        4xx'ler kalıcıdır ve beklemeden {} döner — tek kötü çağrı tüm
+        gather'ı süründürmesin. Backoff jitter'lıdır (thundering herd).
+        """
+        payload = {
+            "jsonrpc": "2.0", "id": next(_next_rpc_id), 
+            "method": method, "params": params
+        }
         for attempt in range(MAX_RETRIES):
             try:
-                payload = {
-                    "jsonrpc": "2.0", "id": int(time.time()*1000), 
-                    "method": method, "params": params
-                }
-                resp = await client.post(RPC_URL, json=payload, timeout=10.0)
+                resp = await client.post(
+                    RPC_URL, content=json_dumps(payload),
+                    headers=_JSON_HEADERS, timeout=10.0
+                )
                 resp.raise_for_status()
-                data = resp.json()
+                data = json_loads(resp.content)
                 if "error" in data:
                     # Rate limit yönetimi
                     if "429" in str(data):
-                        await asyncio.sleep(1 + attempt)
+                        await asyncio.sleep(1 + attempt + random.uniform(0, 0.5))
                         continue
                     return {}
                 return data
-            except Exception:
-                await asyncio.sleep(0.5 * (2 ** attempt))
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+                if code != 429 and code < 500:
+                    return {}  # Kalıcı hata: retry boşuna
+                await asyncio.sleep(random.uniform(0, 0.5 * (2 ** attempt)))
+            except (httpx.TimeoutException, httpx.TransportError, JSONDecodeError):
+                await asyncio.sleep(random.uniform(0, 0.5 * (2 ** attempt)))
         return {}
 
+    async def _rpc_batch_raw(self, client: httpx.AsyncClient, calls: List[tuple]):
+        """Batch POST atar, cevabı decode ETMEDEN bayt olarak döner.
+
+        Büyük cevapların orjson decode'u çağıranın tercihine bırakılır;
+        böylece parse işi asyncio.to_thread ile loop dışına taşınabilir.
+        Dönen: (raw_bytes | None, id listesi)
+        """
+        ids = [next(_next_rpc_id) for _ in calls]
+        if not calls:
+            return None, ids
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in zip(ids, calls)
+        ]
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                resp = await client.post(
+                    RPC_URL, content=json_dumps(payload),
+                    headers=_JSON_HEADERS, timeout=15.0
+                )
+                resp.raise_for_status()
+                return resp.content, ids
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+                if code != 429 and code < 500:
+                    return None, ids  # Kalıcı hata: retry boşuna
+                await asyncio.sleep(random.uniform(0, 0.5 * (2 ** attempt)))
+            except (httpx.TimeoutException, httpx.TransportError):
+                await asyncio.sleep(random.uniform(0, 0.5 * (2 ** attempt)))
+        return None, ids
+
     async def _analyze_wallet_flow(self, client: httpx.AsyncClient, wallet: str, mint: str) -> float:
         """Cüzdanın token üzerindeki net alım/satım hareketini ölçer."""
         async with self.semaphore:
@@ -55,28 +185,45 @@ class WhaleEngine:
             signatures = [s["signature"] for s in sig_resp.get("result", [])]
             if not signatures: return 0.0
 
-            net_change = 0.0
-            # Sadece son 5 işlemi detaylı incele (Hız için)
-            for sig in signatures[:5]:
-                tx_resp = await self._rpc_call(client, "getTransaction", [
+            # Sadece son 5 işlemi detaylı incele (Hız için).
+            # 5 ayrı round-trip yerine tek batch POST: ağ maliyeti bir kez ödenir.
+            raw, ids = await self._rpc_batch_raw(client, [
+                ("getTransaction", [
                     sig, {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
-                ])
-                result = tx_resp.get("result")
-                if not result or result.get("meta", {}).get("err"): continue
-                
-                meta = result["meta"]
-                pre = next((float(b["uiTokenAmount"]["uiAmount"] or 0) for b in meta.get("preTokenBalances", []) if b["owner"] == wallet and b["mint"] == mint), 0.0)
-                post = next((float(b["uiTokenAmount"]["uiAmount"] or 0) for b in meta.get("postTokenBalances", []) if b["owner"] == wallet and b["mint"] == mint), 0.0)
-                
-                net_change += (post - pre)
-            
-            return net_change
+                ]) for sig in signatures[:5]
+            ])
+
+        if raw is None:
+            return 0.0
+        # Büyük parsed-tx gövdelerinin decode'u ve alan taraması CPU işidir;
+        # event loop'u bloklamasın diye worker thread'e taşınır. Semafor bu
+        # noktada bırakılmıştır: ağ slotu parse süresince işgal edilmez.
+        return await asyncio.to_thread(_extract_net_change, raw, ids, wallet, mint)
 
     async def _find_funding_source(self, client: httpx.AsyncClient, wallet: str) -> Optional[str]:
         """
         Cüzdanın ilk fonlayıcısını (Baba Cüzdan) bulur.
         Bu özellik BUNDLE tespiti için kritiktir.
         """
+        # Borsa cüzdanı veya daha önce "yerleşik" damgası yemiş cüzdan:
+        # iki RPC turu da atlanır
+        if wallet in KNOWN_CEX or wallet in self._established_cache:
+            return "Established_User"
+
+        hit = self._funder_cache.get(wallet)
+        if hit is not None:
+            ttl = FUNDER_CACHE_TTL if hit[1] is not None else FUNDER_NONE_TTL
+            if time.monotonic() - hit[0] < ttl:
+                return hit[1]
+
+        result = await self._find_funding_source_uncached(client, wallet)
+        if result == "Established_User":
+            self._established_cache.add(wallet)
+        else:
+            self._funder_cache[wallet] = (time.monotonic(), result)
+        return result
+
+    async def _find_funding_source_uncached(self, client: httpx.AsyncClient, wallet: str) -> Optional[str]:
         async with self.semaphore:
             # 1. En eski işlemi bulmak için sondan başla (Limitli)
             # Eğer cüzdanın 1000'den fazla işlemi varsa "Eski/Güvenli" kabul et.
@@ -95,24 +242,27 @@ class WhaleEngine:
 
             creation_tx_sig = signatures[-1]["signature"]
             
-            # 2. İşlemi detaylandır
+            # 2. İşlemi detaylandır. Sadece accountKeys lazım: "json" encoding
+            # jsonParsed'a göre çok daha küçük gövde döner (instruction
+            # çözümlemesi yok) ve rewards kapatılır.
             tx_resp = await self._rpc_call(client, "getTransaction", [
-                creation_tx_sig, {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
+                creation_tx_sig,
+                {"encoding": "json", "maxSupportedTransactionVersion": 0, "rewards": False}
             ])
             
             result = tx_resp.get("result")
             if not result: return None
             
-            # 3. Parayı kim gönderdi? (Signer 0 genellikle ödeyendir)
+            # 3. Parayı kim gönderdi? "json" encoding'de accountKeys düz
+            # string listesidir ve ilk anahtar her zaman fee ödeyen signer'dır.
             try:
                 accounts = result["transaction"]["message"]["accountKeys"]
-                # Parsed formatta accountKeys bir liste veya dict olabilir, yapıya göre:
-                signer = next((acc["pubkey"] for acc in accounts if acc["signer"]), None)
+                signer = accounts[0] if accounts else None
                 
                 # Eğer signer cüzdanın kendisiyse (nadir), başka kaynaktan gelmiştir.
                 # Genellikle creation tx'de fee ödeyen "Funder"dır.
                 return signer if signer != wallet else "Self_Funded"
-            except:
+            except (KeyError, IndexError, TypeError):
                 return None
 
     async def calculate_whale_pressure(self, mint: str) -> Dict:
@@ -120,76 +270,104 @@ class WhaleEngine:
         ANA FONKSİYON: Hem Balina Baskısını hem de BUNDLE (Küme) analizini yapar.
         """
         start_time = time.time()
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # 1. Toplam Arz ve Holderlar
-            supply_task = self._rpc_call(client, "getTokenSupply", [mint])
-            holders_task = self._rpc_call(client, "getTokenLargestAccounts", [mint])
-            
-            supply_resp, holders_resp = await asyncio.gather(supply_task, holders_task)
-            
-            supply_val = supply_resp.get("result", {}).get("value", {})
-            total_supply = float(supply_val.get("uiAmount") or 1)
-            
-            accounts = holders_resp.get("result", {}).get("value", [])
-            if not accounts: return {"pressure": "Neutral", "bundle_detected": False}
+        client = self.client
 
-            # Top 7 Cüzdanı Analiz Et (Hız/Performans dengesi için 7 iyi)
-            top_wallets = [acc["address"] for acc in accounts[:7]]
-            
-            # --- PARALEL GÖREVLER ---
-            # 1. Flow Analizi (Alıyor mu Satıyor mu?)
-            flow_tasks = [self._analyze_wallet_flow(client, w, mint) for w in top_wallets]
-            
-            # 2. Funding Analizi (Bundle Kontrolü) - KILLER FEATURE
-            fund_tasks = [self._find_funding_source(client, w) for w in top_wallets]
-            
-            results = await asyncio.gather(*flow_tasks, *fund_tasks)
-            
-            # Sonuçları Ayır
-            flows = results[:len(top_wallets)]
-            funders = results[len(top_wallets):]
-            
-            # --- VERİ ANALİZİ ---
-            
-            # A. Balina Baskısı
-            net_flow = sum(f for f in flows if isinstance(f, float))
-            flow_percent = (net_flow / total_supply) * 100
+        # 1. Toplam Arz ve Holderlar
+        supply_task = self._rpc_call(client, "getTokenSupply", [mint])
+        holders_task = self._rpc_call(client, "getTokenLargestAccounts", [mint])
+        
+        supply_resp, holders_resp = await asyncio.gather(supply_task, holders_task)
+        
+        supply_val = supply_resp.get("result", {}).get("value", {})
+        total_supply = float(supply_val.get("uiAmount") or 1)
+        
+        accounts = holders_resp.get("result", {}).get("value", [])
+        if not accounts: return {"pressure": "Neutral", "bundle_detected": False}
+
+        # Top 7 Cüzdanı Analiz Et (Hız/Performans dengesi için 7 iyi).
+        # API aynı adresi tekrar döndürebilir; kopya cüzdan başına fazladan
+        # flow+funder RPC'si gitmesin diye sıra korunarak tekilleştirilir.
+        seen = set()
+        top_wallets: List[str] = []
+        wallet_share: Dict[str, Optional[float]] = {}  # adres -> arz yüzdesi
+        for acc in accounts:
+            addr = acc["address"]
+            if addr not in seen:
+                seen.add(addr)
+                top_wallets.append(addr)
+                # Pay ham "amount"tan hesaplanır: uiAmount null dönebilir
+                # (%0 bug'ının bilinen sebebi) ve payı 0 sanmak bundle
+                # taramasını sessizce kapatırdı. Belirlenemezse None kalır
+                # ve cüzdan fail-open olarak analize dahil edilir.
+                try:
+                    ui = int(acc["amount"]) / (10 ** acc["decimals"])
+                    wallet_share[addr] = (ui / total_supply) * 100
+                except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                    wallet_share[addr] = None
+                if len(top_wallets) == 7:
+                    break
+        
+        # --- PARALEL GÖREVLER ---
+        # 1. Flow Analizi (Alıyor mu Satıyor mu?)
+        flow_tasks = [self._analyze_wallet_flow(client, w, mint) for w in top_wallets]
+        
+        # 2. Funding Analizi (Bundle Kontrolü) - KILLER FEATURE
+        # Sadece anlamlı pay tutan cüzdanlar incelenir; atlananlar için
+        # sonuç listesine None yerleştirilir. Payı bilinmeyen cüzdan atlanMAZ.
+        fund_targets = [
+            w for w in top_wallets
+            if wallet_share[w] is None or wallet_share[w] >= MIN_FUND_SHARE_PCT
+        ]
+        fund_tasks = [self._find_funding_source(client, w) for w in fund_targets]
+        
+        results = await asyncio.gather(*flow_tasks, *fund_tasks)
+        
+        # Sonuçları Ayır
+        flows = results[:len(top_wallets)]
+        funder_by_wallet = dict(zip(fund_targets, results[len(top_wallets):]))
+        funders = [funder_by_wallet.get(w) for w in top_wallets]
+        
+        # --- VERİ ANALİZİ ---
+        
+        # A. Balina Baskısı
+        net_flow = sum(f for f in flows if isinstance(f, float))
+        flow_percent = (net_flow / total_supply) * 100
+        
+        pressure = _PRESSURE_LABELS[bisect.bisect_right(_PRESSURE_BOUNDS, flow_percent)]
+
+        # B. BUNDLE (Küme) Tespiti
+        # Funders listesindeki tekrarları say (None ve Established hariç)
+        suspect_funders = [f for f in funders if f and f not in ["Established_User", "Self_Funded"]]
+        funder_counts = Counter(suspect_funders)
+        
+        # En çok tekrar eden funder (Baba Cüzdan)
+        bundle_alert = False
+        bundle_size = 0
+        main_funder = "None"
+        
+        if funder_counts:
+            most_common = funder_counts.most_common(1)[0] # (Adres, Sayı)
+            main_funder = most_common[0]
+            bundle_size = most_common[1]
             
-            pressure = "Neutral"
-            if flow_percent > 0.5: pressure = "Strong Accumulation"
-            elif flow_percent < -0.5: pressure = "Strong Distribution"
-
-            # B. BUNDLE (Küme) Tespiti
-            # Funders listesindeki tekrarları say (None ve Established hariç)
-            suspect_funders = [f for f in funders if f and f not in ["Established_User", "Self_Funded"]]
-            funder_counts = Counter(suspect_funders)
+            # Eğer 2 veya daha fazla cüzdan aynı kaynaktan geldiyse BUNDLE var!
+            if bundle_size >= 2:
+                bundle_alert = True
+
+        return {
+            "pressure": pressure,
+            "net_flow_percent_supply": round(flow_percent, 4),
             
-            # En çok tekrar eden funder (Baba Cüzdan)
-            bundle_alert = False
-            bundle_size = 0
-            main_funder = "None"
+            # YENİ ÖZELLİKLER
+            "bundle_detected": bundle_alert,
+            "bundle_size": bundle_size,
+            "main_funder": main_funder, # Baba Cüzdan Adresi
+            "scanned_wallets": len(top_wallets),
             
-            if funder_counts:
-                most_common = funder_counts.most_common(1)[0] # (Adres, Sayı)
-                main_funder = most_common[0]
-                bundle_size = most_common[1]
-                
-                # Eğer 2 veya daha fazla cüzdan aynı kaynaktan geldiyse BUNDLE var!
-                if bundle_size >= 2:
-                    bundle_alert = True
-
-            return {
-                "pressure": pressure,
-                "net_flow_percent_supply": round(flow_percent, 4),
-                
-                # YENİ ÖZELLİKLER
-                "bundle_detected": bundle_alert,
-                "bundle_size": bundle_size,
-                "main_funder": main_funder, # Baba Cüzdan Adresi
-                "scanned_wallets": len(top_wallets),
-                
-                "execution_time": round(time.time() - start_time, 2)
-            }
+            "execution_time": round(time.time() - start_time, 2)
+        }
 
-# Singleton
-calculate_whale_pressure = WhaleEngine().calculate_whale_pressure
\ No newline at end of file
+# Singleton: instance isimli export edilir ki lifespan kapanışta
+# aclose() ile kalıcı HTTP client'ı kapatabilsin
+whale_engine = WhaleEngine()
+calculate_whale_pressure = whale_engine.calculate_whale_pressure
\ No newline at end of file